@@ -1,241 +1,815 @@
 """
-(Failing) Numba-accelerated version of pbls_search.
+Numba-accelerated version of pbls_search.
 
-Contains manual implementations for setdiff1d and polyfit.
+Contains manual implementations for window selection and polyfit.
 
 Contents:
     fast_pbls_search
-    fast_pbls_search_jit
+    fast_pbls_search_jit (alias of _pbls_prange_periods)
+    _pbls_prange_flat
+    _pbls_prange_shared
 """
+import math
 import numpy as np
+import numba
 from numba import njit, prange
 
-# rename jit version and return flat tuple instead of dict
-@njit(parallel=True)
-def fast_pbls_search_jit(time, flux, periods, durations, epoch_steps=50, poly_order=2):
+# Compile options shared by every kernel.  The inner loops (power sums,
+# Horner evaluation, variance) are FP-bound, so let LLVM contract and
+# vectorize them.  Inputs are assumed finite; NaNs must be removed upstream.
+_JIT_OPTS = dict(fastmath=True, boundscheck=False, cache=True, error_model='numpy')
+# Window selection must stay IEEE-strict: the transit centers are computed
+# once to size the flat buffers and again to fill them, and contracting the
+# two differently (or the edge arithmetic around them) could move a sample
+# across a window edge.
+_JIT_OPTS_STRICT = dict(_JIT_OPTS, fastmath=False)
+
+
+@njit(**_JIT_OPTS)
+def _accumulate_power_sums(t, f, start, stop, tc, n, S, coef):
+    """Add sum(dt**k), k<2n-1, and sum(dt**k * f), k<n, over t[start:stop]."""
+    for ii in range(start, stop):
+        dt = t[ii] - tc
+        y = f[ii]
+        p = 1.0
+        for k in range(n):
+            S[k] += p
+            coef[k] += p * y
+            p *= dt
+        for k in range(n, 2 * n - 1):
+            S[k] += p
+            p *= dt
+
+
+@njit(**_JIT_OPTS)
+def _polyfit_centered(t, f, lo, ilo, ihi, hi, tc, poly_order, S, G, coef):
+    """
+    Least-squares fit of a polynomial in (t - tc) to f, using the samples in
+    [lo, ilo) and [ihi, hi), i.e. a local window with the transit cut out.
+
+    Accumulates the centered power sums S[k] = sum(dt**k), k=0..2*poly_order,
+    and the moments sum(dt**k * f), k=0..poly_order, in one pass, then solves
+    the normal equations via an in-place Cholesky factorization.  No Vandermonde
+    matrix is built and no LAPACK call is made.
+
+    S (2*poly_order+1,) and G (poly_order+1, poly_order+1) are scratch.  The
+    coefficients are written to `coef` in ascending order (coef[0] is the
+    constant term).
+    """
+    n = poly_order + 1
+    for k in range(2 * n - 1):
+        S[k] = 0.0
+    for k in range(n):
+        coef[k] = 0.0
+    _accumulate_power_sums(t, f, lo, ilo, tc, n, S, coef)
+    _accumulate_power_sums(t, f, ihi, hi, tc, n, S, coef)
+    _solve_normal_equations(n, S, G, coef)
+
+
+@njit(**_JIT_OPTS)
+def _solve_normal_equations(n, S, G, coef):
+    """
+    Solve sum_j S[i+j] c_j = coef[i], i<n, in place in `coef`, via Cholesky.
+    G (n, n) is scratch.
+    """
+    # Cholesky of the Gram matrix G_ij = S[i+j], with a small ridge on the
+    # diagonal (as in pbls.detrend_segment) to avoid singular matrices.
+    eps = 1e-8
+    for i in range(n):
+        for j in range(i + 1):
+            acc = S[i + j]
+            for m in range(j):
+                acc -= G[i, m] * G[j, m]
+            if i == j:
+                G[i, i] = math.sqrt(acc + eps)
+            else:
+                G[i, j] = acc / G[j, j]
+    # forward (L z = b) then back (L^T c = z) substitution
+    for i in range(n):
+        acc = coef[i]
+        for m in range(i):
+            acc -= G[i, m] * coef[m]
+        coef[i] = acc / G[i, i]
+    for i in range(n - 1, -1, -1):
+        acc = coef[i]
+        for m in range(i + 1, n):
+            acc -= G[m, i] * coef[m]
+        coef[i] = acc / G[i, i]
+
+
+@njit(**_JIT_OPTS_STRICT)
+def _searchsorted_from(time, x, start, right):
+    """
+    np.searchsorted(time, x, side='right' if right else 'left'), given that
+    the answer is known to be >= start.  Gallops forward from start, so the
+    cost is logarithmic in the distance travelled rather than in len(time).
+    """
+    N = time.shape[0]
+    lo = start
+    hi = start
+    step = 1
+    while hi < N and ((time[hi] <= x) if right else (time[hi] < x)):
+        lo = hi + 1
+        hi += step
+        step *= 2
+    if hi > N:
+        hi = N
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if (time[mid] <= x) if right else (time[mid] < x):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+@njit(**_JIT_OPTS_STRICT)
+def _transit_bounds(time, Tcenter, half_Tdur, win_Tdur, start):
     """
-    Numba-accelerated clone of pbls_search. Parallelizes over trial periods (and/or epochs).
+    For sorted `time`, return (lo, ilo, ihi, hi) such that time[lo:hi] is the
+    local window (±win_Tdur) around Tcenter and time[ilo:ihi] is the
+    in-transit span (±half_Tdur).  Both intervals are closed.
+
+    `start` must not exceed the true `lo`; walking the transits of one trial
+    in order and passing the previous `lo` satisfies this, since the
+    transit centers are monotone.  Each bound is searched for from the one
+    before it.
     """
-    # Initialize best-fit variables
-    best_snr = -1e300
-    best_period = 0.0
-    best_duration = 0.0
-    best_epoch = 0.0
-    best_depth = 0.0
+    lo = _searchsorted_from(time, Tcenter - win_Tdur, start, False)
+    ilo = _searchsorted_from(time, Tcenter - half_Tdur, lo, False)
+    ihi = _searchsorted_from(time, Tcenter + half_Tdur, ilo, True)
+    hi = _searchsorted_from(time, Tcenter + win_Tdur, ihi, True)
+    return lo, ilo, ihi, hi
+
+
+@njit(**_JIT_OPTS)
+def _polyval_centered(coef, poly_order, dt):
+    """Evaluate the ascending-order polynomial `coef` at dt via Horner's scheme."""
+    acc = coef[poly_order]
+    for k in range(poly_order - 1, -1, -1):
+        acc = acc * dt + coef[k]
+    return acc
+
+@njit(**_JIT_OPTS_STRICT)
+def _trial_model(time, flux, T0, trial_period, half_Tdur, win_Tdur,
+                 n_min, n_max, poly_order, S, G, coef):
+    """
+    Detrend every "good" transit of one (period, duration, epoch) trial.
+
+    Returns the flat arrays (all_in_flux, all_out_flux, local_time,
+    local_flux, model_flux, flux_resid), concatenated over the good transits.
+    All are empty if no transit has enough out-of-transit data.
+    """
+    # First pass: count the "good" transits (those with enough
+    # out-of-transit data to fit a polynomial) and the number of
+    # points they contribute, so that the flat buffers below can
+    # be sized without building a list.
+    tot_in = 0
+    tot_out = 0
+    tot_loc = 0
+    lo = 0
+    for n in range(n_min, n_max + 1):
+        # Center time for the nth transit: transit start + half duration
+        Tcenter = T0 + n * trial_period + half_Tdur
+        lo, ilo, ihi, hi = _transit_bounds(time, Tcenter, half_Tdur, win_Tdur, lo)
+        # Out-of-transit points are [lo, ilo) and [ihi, hi).
+        if (hi - lo) - (ihi - ilo) < (poly_order + 1):
+            continue
+        tot_loc += hi - lo
+        tot_in  += ihi - ilo
+        tot_out += (hi - lo) - (ihi - ilo)
+
+    # allocate flat arrays
+    all_in_flux   = np.empty(tot_in)
+    all_out_flux  = np.empty(tot_out)
+    local_time    = np.empty(tot_loc)
+    local_flux    = np.empty(tot_loc)
+    model_flux    = np.empty(tot_loc)
+    flux_resid    = np.empty(tot_loc)
+    if tot_loc == 0:
+        return (all_in_flux, all_out_flux, local_time, local_flux,
+                model_flux, flux_resid)
+
+    # Second pass: re-walk the good transits, fit and subtract the
+    # local polynomial, and fill the flat arrays.
+    pi = 0    # in-transit pointer
+    po = 0    # out-transit pointer
+    pl = 0    # local-pointer
+    lo = 0
+    for n in range(n_min, n_max + 1):
+        Tcenter = T0 + n * trial_period + half_Tdur
+        lo, ilo, ihi, hi = _transit_bounds(time, Tcenter, half_Tdur, win_Tdur, lo)
+        if (hi - lo) - (ihi - ilo) < (poly_order + 1):
+            continue
+        # time is sorted, so the local window is contiguous: views, no copies
+        t_loc = time[lo:hi]
+        f_loc = flux[lo:hi]
+        nloc = hi - lo
+        in_lo = ilo - lo
+        in_hi = ihi - lo
+        # fit the out-of-transit baseline, centered on Tcenter
+        # so that the normal equations are well-conditioned
+        _polyfit_centered(
+            t_loc, f_loc, 0, in_lo, in_hi, nloc, Tcenter,
+            poly_order, S, G, coef
+        )
+        # evaluate on full local grid, and subtract the polynomial
+        # from all data in the local window
+        for ii in range(nloc):
+            mval = _polyval_centered(coef, poly_order, t_loc[ii] - Tcenter)
+            local_time[pl + ii] = t_loc[ii]
+            local_flux[pl + ii] = f_loc[ii]
+            model_flux[pl + ii] = mval
+            flux_resid[pl + ii] = f_loc[ii] - mval
+        # split in/out: in-transit is [in_lo, in_hi), the rest is out
+        for ii in range(in_lo, in_hi):
+            all_in_flux[pi] = flux_resid[pl + ii]
+            pi += 1
+        for ii in range(in_lo):
+            all_out_flux[po] = flux_resid[pl + ii]
+            po += 1
+        for ii in range(in_hi, nloc):
+            all_out_flux[po] = flux_resid[pl + ii]
+            po += 1
+        pl += nloc
+
+    return (all_in_flux, all_out_flux, local_time, local_flux,
+            model_flux, flux_resid)
+
+
+@njit(**_JIT_OPTS_STRICT)
+def _trial_snr(time, flux, T0, trial_period, half_Tdur, win_Tdur,
+               n_min, n_max, poly_order, S, G, coef):
+    """
+    Transit SNR and depth of one (period, duration, epoch) trial.  Returns
+    (-1e300, 0.) if no transit in the trial is "good".
+
+    Same statistics as computed from the _trial_model arrays, but in a single
+    pass with no allocations: each corrected flux value is folded into
+    Welford running (count, mean, M2) accumulators for in- and out-of-transit
+    as soon as it is computed.
+    """
+    n_in = 0
+    mean_in = 0.0
+    M2_in = 0.0
+    n_out = 0
+    mean_out = 0.0
+    M2_out = 0.0
+    lo = 0
+    for n in range(n_min, n_max + 1):
+        Tcenter = T0 + n * trial_period + half_Tdur
+        lo, ilo, ihi, hi = _transit_bounds(time, Tcenter, half_Tdur, win_Tdur, lo)
+        if (hi - lo) - (ihi - ilo) < (poly_order + 1):
+            continue
+        _polyfit_centered(
+            time, flux, lo, ilo, ihi, hi, Tcenter, poly_order, S, G, coef
+        )
+        for ii in range(lo, hi):
+            x = flux[ii] - _polyval_centered(coef, poly_order, time[ii] - Tcenter)
+            if ilo <= ii < ihi:
+                n_in += 1
+                delta = x - mean_in
+                mean_in += delta / n_in
+                M2_in += delta * (x - mean_in)
+            else:
+                n_out += 1
+                delta = x - mean_out
+                mean_out += delta / n_out
+                M2_out += delta * (x - mean_out)
+    if n_in == 0 or n_out == 0:
+        return -1e300, 0.0
+
+    depth = mean_out - mean_in
+    var_in  = M2_in / n_in
+    var_out = M2_out / n_out
+    snr = depth / np.sqrt(var_in/n_in + var_out/n_out)
+    return snr, depth
 
-    # Prepare containers for best model (must be arrays for numba)
-    best_local_time = np.empty(0, dtype=np.float64)
-    best_local_flux = np.empty(0, dtype=np.float64)
-    best_model_flux = np.empty(0, dtype=np.float64)
-    best_flux_resid = np.empty(0, dtype=np.float64)
-    best_all_in_transit_flux = np.empty(0, dtype=np.float64)
-    best_all_out_transit_flux = np.empty(0, dtype=np.float64)
 
-    power_list = np.empty(periods.shape[0])
+@njit(**_JIT_OPTS)
+def _update_power_sums(dt, y, w, n, S, M):
+    """Add w * (sum(dt**k), k<2n-1, and sum(dt**k * y), k<n) for one sample."""
+    p = w
+    for k in range(n):
+        S[k] += p
+        M[k] += p * y
+        p *= dt
+    for k in range(n, 2 * n - 1):
+        S[k] += p
+        p *= dt
+
+
+@njit(**_JIT_OPTS)
+def _sliding_baseline(time, flux, half_Tdur, win_Tdur, poly_order, resid, valid):
+    """
+    Notched sliding-window polynomial detrending, shared by every epoch of
+    one (period, duration) pair.
+
+    For each sample i, fits a polynomial to the samples with
+    half_Tdur < |t - t_i| <= win_Tdur, i.e. the local window and transit
+    cut-out that the per-transit fit would use for a transit centered on
+    t_i, and writes flux[i] minus the fit at t_i to resid[i].  valid[i] is
+    False (and resid[i] is 0) if fewer than poly_order+1 samples are
+    available.
+
+    The power sums of the two bands either side of t_i are updated
+    incrementally as the window slides, in coordinates relative to an anchor
+    sample.  The anchor is moved, and the sums recomputed from scratch, once
+    the window has slid by win_Tdur; this bounds both |dt| and the
+    accumulated add/remove round-off.  Total cost is O(N) per call.
+    """
+    N = time.shape[0]
+    n = poly_order + 1
+    SL = np.zeros(2 * n - 1)
+    ML = np.zeros(n)
+    SR = np.zeros(2 * n - 1)
+    MR = np.zeros(n)
+    S = np.empty(2 * n - 1)
+    G = np.empty((n, n))
+    coef = np.empty(n)
+
+    # Left band is [lo, ilo), right band is [ihi, hi).
+    lo = 0
+    ilo = 0
+    ihi = 0
+    hi = 0
+    anchor = time[0]
+    for i in range(N):
+        ti = time[i]
+        if ti - anchor > win_Tdur:
+            anchor = ti
+            for k in range(2 * n - 1):
+                SL[k] = 0.0
+                SR[k] = 0.0
+            for k in range(n):
+                ML[k] = 0.0
+                MR[k] = 0.0
+            for jj in range(lo, ilo):
+                _update_power_sums(time[jj] - anchor, flux[jj], 1.0, n, SL, ML)
+            for jj in range(ihi, hi):
+                _update_power_sums(time[jj] - anchor, flux[jj], 1.0, n, SR, MR)
+
+        # A sample enters the right band, crosses the cut-out, enters the
+        # left band and finally leaves it; each pointer only moves forward.
+        while hi < N and time[hi] <= ti + win_Tdur:
+            _update_power_sums(time[hi] - anchor, flux[hi], 1.0, n, SR, MR)
+            hi += 1
+        while ihi < N and time[ihi] <= ti + half_Tdur:
+            _update_power_sums(time[ihi] - anchor, flux[ihi], -1.0, n, SR, MR)
+            ihi += 1
+        while ilo < N and time[ilo] < ti - half_Tdur:
+            _update_power_sums(time[ilo] - anchor, flux[ilo], 1.0, n, SL, ML)
+            ilo += 1
+        while lo < N and time[lo] < ti - win_Tdur:
+            _update_power_sums(time[lo] - anchor, flux[lo], -1.0, n, SL, ML)
+            lo += 1
+
+        if (ilo - lo) + (hi - ihi) < n:
+            valid[i] = False
+            resid[i] = 0.0
+            continue
+        for k in range(2 * n - 1):
+            S[k] = SL[k] + SR[k]
+        for k in range(n):
+            coef[k] = ML[k] + MR[k]
+        _solve_normal_equations(n, S, G, coef)
+        valid[i] = True
+        resid[i] = flux[i] - _polyval_centered(coef, poly_order, ti - anchor)
+
+
+@njit(**_JIT_OPTS)
+def _prefix_sums(resid, valid, C, R1, R2):
+    """
+    Cumulative count, sum and sum of squares of the valid residuals, so that
+    the statistics of any index range [a, b) are C[b]-C[a], etc.  The output
+    arrays have length len(resid) + 1.
+    """
+    C[0] = 0
+    R1[0] = 0.0
+    R2[0] = 0.0
+    for i in range(resid.shape[0]):
+        if valid[i]:
+            r = resid[i]
+            C[i + 1] = C[i] + 1
+            R1[i + 1] = R1[i] + r
+            R2[i + 1] = R2[i] + r * r
+        else:
+            C[i + 1] = C[i]
+            R1[i + 1] = R1[i]
+            R2[i + 1] = R2[i]
+
+
+@njit(**_JIT_OPTS_STRICT)
+def _trial_snr_shared(time, C, R1, R2, T0, trial_period, half_Tdur, win_Tdur,
+                      n_min, n_max, poly_order):
+    """
+    As _trial_snr, but scoring residuals of a precomputed _sliding_baseline
+    through their prefix sums (see _prefix_sums), at O(1) per transit.  The
+    same transits are kept as in _trial_model.
+    """
+    n_in = 0
+    n_out = 0
+    s_in = 0.0
+    s_out = 0.0
+    q_in = 0.0
+    q_out = 0.0
+    lo = 0
+    for n in range(n_min, n_max + 1):
+        Tcenter = T0 + n * trial_period + half_Tdur
+        lo, ilo, ihi, hi = _transit_bounds(time, Tcenter, half_Tdur, win_Tdur, lo)
+        if (hi - lo) - (ihi - ilo) < (poly_order + 1):
+            continue
+        n_in += C[ihi] - C[ilo]
+        s_in += R1[ihi] - R1[ilo]
+        q_in += R2[ihi] - R2[ilo]
+        n_out += (C[ilo] - C[lo]) + (C[hi] - C[ihi])
+        s_out += (R1[ilo] - R1[lo]) + (R1[hi] - R1[ihi])
+        q_out += (R2[ilo] - R2[lo]) + (R2[hi] - R2[ihi])
+    if n_in == 0 or n_out == 0:
+        return -1e300, 0.0
+
+    mean_in = s_in / n_in
+    mean_out = s_out / n_out
+    depth = mean_out - mean_in
+    var_in = max(q_in / n_in - mean_in * mean_in, 0.0)
+    var_out = max(q_out / n_out - mean_out * mean_out, 0.0)
+    snr = depth / np.sqrt(var_in/n_in + var_out/n_out)
+    return snr, depth
+
+
+@njit(**_JIT_OPTS)
+def _min_spacing(time):
+    """Smallest gap between consecutive samples of sorted `time`."""
+    dt_min = np.inf
+    for ii in range(1, time.shape[0]):
+        dt = time[ii] - time[ii - 1]
+        if dt < dt_min:
+            dt_min = dt
+    return dt_min
+
+
+@njit(**_JIT_OPTS)
+def _window_too_sparse(win_Tdur, dt_min, poly_order):
+    """
+    True if no ±win_Tdur window can contain poly_order+1 samples, given the
+    smallest sample spacing dt_min: such a (period, duration) pair has no
+    good transit at any epoch.  (A closed window of width W holds at most
+    floor(W / dt_min) + 1 samples; the margin keeps the test conservative.)
+    """
+    return 2.0 * win_Tdur * (1.0 + 1e-9) < poly_order * dt_min
+
+
+@njit(parallel=True, **_JIT_OPTS)
+def _pbls_prange_periods(time, flux, periods, durations, epoch_steps=50, poly_order=2):
+    """
+    Numba-accelerated clone of pbls_search.  Parallelizes over trial periods.
+
+    Each period iteration writes only to its own slot of the per-period
+    output arrays.  Returns (power, best_duration, best_epoch, best_depth),
+    each of length len(periods).
+    """
+    P = periods.shape[0]
+    # (np.empty, not np.zeros: every slot is written below, and np.zeros
+    # would add parallel loops of its own)
+    power_list = np.empty(P)
+    per_best_duration = np.empty(P)
+    per_best_epoch = np.empty(P)
+    per_best_depth = np.empty(P)
     
-    # Sort time & flux
-    # ...numba‐friendly sort or assume pre‐sorted...
+    # NOTE: time must be sorted (see fast_pbls_search); the transit windows
+    # are located by binary search.
+    t_first = time[0]
+    t_last = time[-1]
+    baseline_time = t_last - t_first
+    inv_epoch_step = 1.0 / max(epoch_steps - 1, 1)
+    dt_min = _min_spacing(time)
 
     # Outer loop over periods
-    for i in prange(periods.shape[0]):
+    for i in prange(P):
         trial_period = periods[i]
         period_max_snr = -1e300
+        period_best_duration = 0.0
+        period_best_epoch = 0.0
+        period_best_depth = 0.0
+        n_periods_in_baseline = baseline_time / trial_period
 
+        # per-period (hence per-thread) scratch for the polynomial fits
+        S = np.empty(2 * poly_order + 1)
+        G = np.empty((poly_order + 1, poly_order + 1))
+        coef = np.empty(poly_order + 1)
+
+        # NOTE: keep the inner loops as `range`.  numba only parallelizes the
+        # outermost prange; a nested prange is serialized, with extra
+        # overhead.  tests/test_jit_pbls.py checks for a single parallel loop.
         # Loop over durations
         for j in range(durations.shape[0]):
             trial_duration = durations[j]
             Tdur = trial_duration * trial_period
+            half_Tdur = 0.5 * Tdur
+            win_Tdur = 3.0 * Tdur
+            if _window_too_sparse(win_Tdur, dt_min, poly_order):
+                continue
+            epoch_step = (1.0 - trial_duration) * inv_epoch_step
             # Loop over epochs
             for k in range(epoch_steps):
-                epoch = k * (1.0 - trial_duration) / max(epoch_steps-1,1)
+                epoch = k * epoch_step
                 
                 # Define a reference transit start time T0 (the first possible transit)
-                T0 = time[0] + epoch * trial_period
+                T0 = t_first + epoch * trial_period
                 
                 # Determine how many transits fall within the observation window:
-                n_min = int(np.ceil((time[0] - T0) / trial_period))
-                n_max = int(np.floor((time[-1] - T0) / trial_period))
-                
-                # First pass: Identify "good" transits that have enough data to fit a polynomial.
-                good_transits = []
-                for n in range(n_min, n_max + 1):
-                    # Center time for the nth transit: transit start + half duration
-                    Tcenter = T0 + n * trial_period + 0.5 * Tdur
-                    
-                    # Define the local window (±3 transit durations)
-                    local_start = Tcenter - 3.0 * Tdur
-                    local_end   = Tcenter + 3.0 * Tdur
-                    local_mask = (time >= local_start) & (time <= local_end)
-                    local_idx = np.where(local_mask)[0]
-                    if len(local_idx) < (poly_order + 1):
-                        continue
-                    
-                    # Define the in-transit region (±0.5 Tdur around Tcenter)
-                    in_transit_start = Tcenter - 0.5 * Tdur
-                    in_transit_end   = Tcenter + 0.5 * Tdur
-                    in_transit_full = (time >= in_transit_start) & (time <= in_transit_end)
-                    # Get indices relative to the local window
-                    in_transit_local = np.where(in_transit_full[local_idx])[0]
-                    # Out-of-transit indices within the local window:
-                    # Manual out-of-transit index computation (numba‐friendly)
-                    n_local = len(local_idx)
-                    temp_out = np.empty(n_local, np.int64)
-                    cnt = 0
-                    for ii in range(n_local):
-                        is_in = False
-                        for jj in range(len(in_transit_local)):
-                            if ii == in_transit_local[jj]:
-                                is_in = True
-                                break
-                        if not is_in:
-                            temp_out[cnt] = ii
-                            cnt += 1
-                    out_transit_local = temp_out[:cnt]
-                    if cnt < (poly_order + 1):
-                        continue
-                    good_transits.append((local_idx, in_transit_local))
-                
-                # If no transit in this (period, duration, epoch) trial is "good", skip it.
-                if len(good_transits) == 0:
+                # (t_first - T0)/P = -epoch, (t_last - T0)/P = baseline/P - epoch
+                n_min = int(math.ceil(-epoch))
+                n_max = int(math.floor(n_periods_in_baseline - epoch))
+                if n_max < n_min:
                     continue
-                
-                # --- begin numba-friendly concat replacement ---
-                # 1) compute total sizes
-                tot_in = 0
-                tot_out = 0
-                tot_loc = 0
-                for gt in good_transits:
-                    loc_idx, in_idx = gt
-                    nloc = loc_idx.shape[0]
-                    nin  = in_idx.shape[0]
-                    tot_loc += nloc
-                    tot_in  += nin
-                    tot_out += (nloc - nin)
-                # 2) allocate flat arrays
-                all_in_flux   = np.empty(tot_in)
-                all_out_flux  = np.empty(tot_out)
-                local_time    = np.empty(tot_loc)
-                local_flux    = np.empty(tot_loc)
-                model_flux    = np.empty(tot_loc)
-                flux_resid    = np.empty(tot_loc)
-                # 3) fill them
-                pi = 0    # in-transit pointer
-                po = 0    # out-transit pointer
-                pl = 0    # local-pointer
-                for gt in good_transits:
-                    loc_idx, in_idx = gt
-                    t_loc = time[loc_idx]
-                    f_loc = flux[loc_idx]
-                    # fit+model (use your existing manual Vandermonde code here)
-                    # manual Vandermonde fit for numba
-                    x = t_loc[out_transit_local]
-                    y = f_loc[out_transit_local]
-                    m = x.shape[0]
-                    n = poly_order + 1
-                    # build Vandermonde matrix A (m × n)
-                    A = np.empty((m, n))
-                    for ii in range(m):
-                        for jj in range(n):
-                            A[ii, jj] = x[ii] ** (poly_order - jj)
-                    # normal equations: ATA · coef = ATy
-                    AT = A.T
-                    ATA = AT.dot(A)
-                    ATy = AT.dot(y)
-                    coef = np.linalg.solve(ATA, ATy)
-                    # evaluate on full local grid
-                    Nloc = t_loc.shape[0]
-                    model_vals = np.empty(Nloc)
-                    for ii in range(Nloc):
-                        acc = 0.0
-                        for jj in range(n):
-                            acc += coef[jj] * (t_loc[ii] ** (poly_order - jj))
-                        model_vals[ii] = acc
-                    
-                    # Subtract the polynomial from all data in the local window
-                    f_local_corrected = f_loc - model_vals
-
-                    # copy local blocks
-                    nloc = t_loc.shape[0]
-                    for ii in range(nloc):
-                        local_time[pl] = t_loc[ii]
-                        local_flux[pl] = f_loc[ii]
-                        model_flux[pl] = model_vals[ii]
-                        flux_resid[pl] = f_local_corrected[ii]
-                        pl += 1
-                    # split in/out
-                    for jj in range(in_idx.shape[0]):
-                        all_in_flux[pi] = f_local_corrected[in_idx[jj]]
-                        pi += 1
-                    # out: any index not in in_idx
-                    for ii in range(nloc):
-                        is_in = False
-                        for jj in range(in_idx.shape[0]):
-                            if ii == in_idx[jj]:
-                                is_in = True
-                                break
-                        if not is_in:
-                            all_out_flux[po] = f_local_corrected[ii]
-                            po += 1
-
-                # now use all_in_flux, all_out_flux, local_time/flux/model_flux/flux_resid
-                depth = np.mean(all_out_flux) - np.mean(all_in_flux)
-                n_in  = tot_in
-                n_out = tot_out
-                var_in  = np.var(all_in_flux)
-                var_out = np.var(all_out_flux)
-                snr = depth / np.sqrt(var_in/n_in + var_out/n_out)
-
-                # update period_max_snr and best_* as before using these flat arrays
+
+                snr, depth = _trial_snr(
+                    time, flux, T0, trial_period, half_Tdur, win_Tdur,
+                    n_min, n_max, poly_order, S, G, coef
+                )
+
                 # Update period-level max SNR
                 if snr > period_max_snr:
                     period_max_snr = snr
-                
-                # Update global best parameters and best-model arrays if this trial is best so far
+                    period_best_duration = trial_duration
+                    period_best_epoch = epoch
+                    period_best_depth = depth
+
+        power_list[i] = period_max_snr
+        per_best_duration[i] = period_best_duration
+        per_best_epoch[i] = period_best_epoch
+        per_best_depth[i] = period_best_depth
+
+    return power_list, per_best_duration, per_best_epoch, per_best_depth
+
+
+@njit(parallel=True, **_JIT_OPTS)
+def _pbls_prange_flat(time, flux, periods, durations, epoch_steps=50, poly_order=2):
+    """
+    As _pbls_prange_periods, but parallelizes over the flattened
+    (period, duration, epoch) grid.  Preferable when there are too few trial
+    periods to keep every thread busy (e.g. small chunks of a period grid).
+    """
+    P = periods.shape[0]
+    D = durations.shape[0]
+    E = epoch_steps
+    snr_grid = np.empty(P * D * E)
+    depth_grid = np.empty(P * D * E)
+
+    t_first = time[0]
+    t_last = time[-1]
+    baseline_time = t_last - t_first
+    inv_epoch_step = 1.0 / max(epoch_steps - 1, 1)
+    dt_min = _min_spacing(time)
+
+    for ix in prange(P * D * E):
+        # (cast: the prange index is unsigned, and mixing it with signed
+        # ints would promote to float)
+        i, jk = divmod(np.int64(ix), np.int64(D * E))
+        j, k = divmod(jk, np.int64(E))
+        trial_period = periods[i]
+        trial_duration = durations[j]
+        Tdur = trial_duration * trial_period
+        epoch = k * (1.0 - trial_duration) * inv_epoch_step
+        T0 = t_first + epoch * trial_period
+        n_min = int(math.ceil(-epoch))
+        n_max = int(math.floor(baseline_time / trial_period - epoch))
+
+        snr = -1e300
+        depth = 0.0
+        if n_max >= n_min and not _window_too_sparse(3.0 * Tdur, dt_min, poly_order):
+            S = np.empty(2 * poly_order + 1)
+            G = np.empty((poly_order + 1, poly_order + 1))
+            coef = np.empty(poly_order + 1)
+            snr, depth = _trial_snr(
+                time, flux, T0, trial_period, 0.5 * Tdur, 3.0 * Tdur,
+                n_min, n_max, poly_order, S, G, coef
+            )
+        snr_grid[ix] = snr
+        depth_grid[ix] = depth
+
+    # Serial reduction to the per-period maxima, in the same (duration,
+    # epoch) order as _pbls_prange_periods so that ties resolve identically.
+    power_list = np.empty(P)
+    per_best_duration = np.zeros(P)
+    per_best_epoch = np.zeros(P)
+    per_best_depth = np.zeros(P)
+    for i in range(P):
+        period_max_snr = -1e300
+        for j in range(D):
+            for k in range(E):
+                ix = (i * D + j) * E + k
+                if snr_grid[ix] > period_max_snr:
+                    period_max_snr = snr_grid[ix]
+                    per_best_duration[i] = durations[j]
+                    per_best_epoch[i] = k * (1.0 - durations[j]) * inv_epoch_step
+                    per_best_depth[i] = depth_grid[ix]
+        power_list[i] = period_max_snr
+
+    return power_list, per_best_duration, per_best_epoch, per_best_depth
+
+
+@njit(parallel=True, **_JIT_OPTS)
+def _pbls_prange_shared(time, flux, periods, durations, epoch_steps=50, poly_order=2):
+    """
+    Approximate variant of _pbls_prange_periods that detrends once per
+    (period, duration) pair with _sliding_baseline, rather than re-fitting
+    every transit of every epoch.  Parallelizes over the (period, duration)
+    pairs; the epoch loop then costs O(log N) per transit.
+
+    The baseline under each in-transit sample is fit around that sample
+    rather than around the transit center, so the SNRs differ slightly from
+    the exact kernels.
+    """
+    P = periods.shape[0]
+    D = durations.shape[0]
+    N = time.shape[0]
+    snr_grid = np.empty(P * D)
+    epoch_grid = np.empty(P * D)
+    depth_grid = np.empty(P * D)
+
+    t_first = time[0]
+    t_last = time[-1]
+    baseline_time = t_last - t_first
+    inv_epoch_step = 1.0 / max(epoch_steps - 1, 1)
+    dt_min = _min_spacing(time)
+
+    for ix in prange(P * D):
+        # (cast: see _pbls_prange_flat)
+        i, j = divmod(np.int64(ix), np.int64(D))
+        trial_period = periods[i]
+        trial_duration = durations[j]
+        Tdur = trial_duration * trial_period
+        half_Tdur = 0.5 * Tdur
+        win_Tdur = 3.0 * Tdur
+        epoch_step = (1.0 - trial_duration) * inv_epoch_step
+        n_periods_in_baseline = baseline_time / trial_period
+
+        best_snr = -1e300
+        best_epoch = 0.0
+        best_depth = 0.0
+        if not _window_too_sparse(win_Tdur, dt_min, poly_order):
+            resid = np.empty(N)
+            valid = np.empty(N, dtype=np.bool_)
+            _sliding_baseline(time, flux, half_Tdur, win_Tdur, poly_order, resid, valid)
+            C = np.empty(N + 1, dtype=np.int64)
+            R1 = np.empty(N + 1)
+            R2 = np.empty(N + 1)
+            _prefix_sums(resid, valid, C, R1, R2)
+
+            for k in range(epoch_steps):
+                epoch = k * epoch_step
+                T0 = t_first + epoch * trial_period
+                n_min = int(math.ceil(-epoch))
+                n_max = int(math.floor(n_periods_in_baseline - epoch))
+                if n_max < n_min:
+                    continue
+                snr, depth = _trial_snr_shared(
+                    time, C, R1, R2, T0, trial_period, half_Tdur, win_Tdur,
+                    n_min, n_max, poly_order
+                )
                 if snr > best_snr:
                     best_snr = snr
-                    best_period = trial_period
-                    best_duration = trial_duration
                     best_epoch = epoch
                     best_depth = depth
-                    
-                    best_local_time = local_time
-                    best_local_flux = local_flux
-                    best_model_flux = model_flux
-                    best_flux_resid = flux_resid
-                    best_all_in_transit_flux = all_in_flux
-                    best_all_out_transit_flux = all_out_flux
-                # --- end replacement ---
+        snr_grid[ix] = best_snr
+        epoch_grid[ix] = best_epoch
+        depth_grid[ix] = best_depth
 
+    # Serial reduction to the per-period maxima, in duration order.
+    power_list = np.empty(P)
+    per_best_duration = np.zeros(P)
+    per_best_epoch = np.zeros(P)
+    per_best_depth = np.zeros(P)
+    for i in range(P):
+        period_max_snr = -1e300
+        for j in range(D):
+            ix = i * D + j
+            if snr_grid[ix] > period_max_snr:
+                period_max_snr = snr_grid[ix]
+                per_best_duration[i] = durations[j]
+                per_best_epoch[i] = epoch_grid[ix]
+                per_best_depth[i] = depth_grid[ix]
         power_list[i] = period_max_snr
-    
-    # instead of building a nested dict, return all components
-    return (
-        best_period, best_duration, best_epoch, best_depth, best_snr,
-        power_list, periods,
-        best_local_time, best_local_flux, best_model_flux, best_flux_resid,
-        best_all_in_transit_flux, best_all_out_transit_flux
+
+    return power_list, per_best_duration, per_best_epoch, per_best_depth
+
+
+# Backwards-compatible name for the parallel-over-periods kernel.
+fast_pbls_search_jit = _pbls_prange_periods
+
+
+@njit(**_JIT_OPTS)
+def _best_model(time, flux, period, duration, epoch, poly_order=2):
+    """
+    Re-derive the detrended arrays of a single (period, duration, epoch)
+    trial, e.g. the global best one.  Returns (local_time, local_flux,
+    model_flux, flux_resid, all_in_flux, all_out_flux).
+    """
+    S = np.empty(2 * poly_order + 1)
+    G = np.empty((poly_order + 1, poly_order + 1))
+    coef = np.empty(poly_order + 1)
+    t_first = time[0]
+    Tdur = duration * period
+    n_min = int(math.ceil(-epoch))
+    n_max = int(math.floor((time[-1] - t_first) / period - epoch))
+    (all_in_flux, all_out_flux, local_time, local_flux, model_flux,
+     flux_resid) = _trial_model(
+        time, flux, t_first + epoch * period, period, 0.5 * Tdur, 3.0 * Tdur,
+        n_min, n_max, poly_order, S, G, coef
     )
+    return (local_time, local_flux, model_flux, flux_resid,
+            all_in_flux, all_out_flux)
+
 
 # Python wrapper to assemble the final dict
-def fast_pbls_search(time, flux, periods, durations, epoch_steps=50, poly_order=2):
-    bp, bd, be, bdepth, bsnr, power, per, tloc, floc, mflux, fresid, influx, outflux = \
-        fast_pbls_search_jit(time, flux, periods, durations, epoch_steps, poly_order)
+def fast_pbls_search(time, flux, periods, durations, epoch_steps=50, poly_order=2,
+                     shared_baseline=False, return_best_model=True):
+    """
+    Run the numba PBLS kernel and assemble a pbls_search-like result dict.
+
+    The parallel loop level is chosen by iteration count: over trial periods
+    if there are enough of them to keep every thread busy, otherwise over the
+    flattened (period, duration, epoch) grid.
+
+    If shared_baseline is True, the approximate _pbls_prange_shared kernel is
+    used instead: one sliding-window baseline per (period, duration), shared
+    by all epochs.  best_model is still computed with per-transit fits.
+
+    If return_best_model is False, the best trial is not re-detrended and
+    'best_model' is None (periodogram-only; e.g. for non-final chunks).
+
+    time and flux are copied into contiguous float64 arrays, and the kernels
+    see time relative to its first sample, t0.  best_params['epoch'] is the
+    phase of the first transit start relative to t0; best_params['epoch_days']
+    is the same instant in the input time system.  best_model['time'] is
+    returned in the input time system.
+    """
+    time = np.ascontiguousarray(time, dtype=np.float64)
+    flux = np.ascontiguousarray(flux, dtype=np.float64)
+    periods = np.ascontiguousarray(periods, dtype=np.float64)
+    durations = np.ascontiguousarray(durations, dtype=np.float64)
+
+    # Ensure time and flux are sorted in time
+    sort_idx = np.argsort(time)
+    time = time[sort_idx]
+    flux = flux[sort_idx]
+
+    # Work relative to the first sample: smaller magnitudes for the
+    # window arithmetic and the polynomial fits.
+    t0 = time[0]
+    time = time - t0
+
+    if shared_baseline:
+        kernel = _pbls_prange_shared
+    elif len(periods) >= 4 * numba.get_num_threads():
+        kernel = _pbls_prange_periods
+    else:
+        kernel = _pbls_prange_flat
+    power, per_dur, per_epoch, per_depth = kernel(
+        time, flux, periods, durations, epoch_steps, poly_order
+    )
+
+    # Serial reduction to the global best trial.
+    best_ix = int(np.argmax(power))
+    bsnr = power[best_ix]
+    if bsnr > -1e300:
+        bp = periods[best_ix]
+        bd = per_dur[best_ix]
+        be = per_epoch[best_ix]
+        bdepth = per_depth[best_ix]
+    else:
+        bp, bd, be, bdepth = 0.0, 0.0, 0.0, 0.0
+
+    best_model = None
+    if return_best_model:
+        if bsnr > -1e300:
+            tloc, floc, mflux, fresid, influx, outflux = _best_model(
+                time, flux, bp, bd, be, poly_order
+            )
+            tloc = tloc + t0
+        else:
+            tloc = floc = mflux = fresid = influx = outflux = np.empty(0)
+        best_model = {
+            'time': tloc,
+            'flux': floc,
+            'model_flux': mflux,
+            'flux_resid': fresid,
+            'all_in_transit_flux': influx,
+            'all_out_transit_flux': outflux
+        }
+
     return {
         'best_params': {
             'period': bp,
             'duration': bd,
             'epoch': be,
+            'epoch_days': t0 + be * bp,
             'depth': bdepth,
             'snr': bsnr
         },
         'power': power,
-        'periods': per,
-        'best_model': {
-            'time': tloc,
-            'flux': floc,
-            'model_flux': mflux,
-            'flux_resid': fresid,
-            'all_in_transit_flux': influx,
-            'all_out_transit_flux': outflux
-        }
-    }
\ No newline at end of file
+        'periods': periods,
+        'best_model': best_model
+    }
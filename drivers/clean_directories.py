@@ -12,6 +12,12 @@ import os
 import sys
 from datetime import datetime
 from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+
+def _new_name(filepath, timestamp, suffix):
+    pre = filepath.split(".")[0]
+    post = filepath.split(".")[1]
+    return ".".join([f"{pre}_{timestamp}_{suffix}", post])
 
 def clean_result_and_log_directories(star_id, maxiter=3):
     """
@@ -52,12 +58,16 @@ def clean_result_and_log_directories(star_id, maxiter=3):
     timestamp = datetime.now().strftime('%Y%m%d')
     suffix = os.urandom(4).hex()
 
-    for filepath in allfiles:
-        pre = filepath.split(".")[0]
-        post = filepath.split(".")[1]
-        new_filepath = ".".join([f"{pre}_{timestamp}_{suffix}", post])
+    def _move(filepath):
+        new_filepath = _new_name(filepath, timestamp, suffix)
         os.rename(filepath, new_filepath)
-        print(f"Moved existing file to: {new_filepath}")
+        return new_filepath
+
+    # The renames are independent metadata operations on a network
+    # filesystem; overlap their latency.
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        for new_filepath in ex.map(_move, allfiles):
+            print(f"Moved existing file to: {new_filepath}")
 
     for dirtype, directory in zip(dirtypes, [results_dir, logs_dir, proc_dir]):
 
@@ -75,9 +85,12 @@ def clean_result_and_log_directories(star_id, maxiter=3):
             print(f"Created {dirtype} directory: {directory}")
 
     for directory in iter_dirs:
-        if not os.path.exists(directory):
+        # one makedirs, rather than an exists check first
+        try:
             os.makedirs(directory)
-            print(f"Created {dirtype} directory: {directory}")
+        except FileExistsError:
+            continue
+        print(f"Created iteration log directory: {directory}")
 
 
 if __name__ == "__main__":
@@ -10,11 +10,11 @@ star_id = "kplr006184894" # Kepler-1627
 #star_id = 'kplr008653134' # Kepler-1643
 ####################
 
-lines = [f"{star_id},{ix},5000\n" for ix in range(5000)]
+N_jobs = 5000
 joblist_path = "debug_jobs.joblist"
 with open(joblist_path, "w") as f:
-	f.writelines(lines)
-print(f"Created joblist with {len(lines)} entries at {joblist_path}")
+	f.write("".join(f"{star_id},{ix},{N_jobs}\n" for ix in range(N_jobs)))
+print(f"Created joblist with {N_jobs} entries at {joblist_path}")
 
 from clean_directories import clean_result_and_log_directories
 clean_result_and_log_directories(star_id)
\ No newline at end of file
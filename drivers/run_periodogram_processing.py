@@ -34,7 +34,9 @@ import numpy as np, pandas as pd
 from pbls.getters import (
     get_OSG_local_fits_lightcurve, get_OSG_local_csv_lightcurve, parse_star_id
 )
-from pbls.lc_processing import preprocess_lightcurve, get_LS_Prot
+from pbls.lc_processing import (
+    preprocess_lightcurve, get_LS_Prot, select_finite, LC_COLUMNS
+)
 from pbls.periodogram_processing import iterative_gaussian_whitening, trimmean_whitening
 from pbls.pbls import pbls_search
 from pbls.visualization import plot_summary_figure
@@ -76,7 +78,8 @@ def main():
         if hostname in ['wh1', 'wh2', 'wh3', 'marduk.local']:
             raise NotImplementedError
         else:
-            datas, hdrs = get_OSG_local_fits_lightcurve(base_star_id)
+            datas, hdrs = get_OSG_local_fits_lightcurve(
+                base_star_id, columns=LC_COLUMNS[mission])
             N_lcfiles = len(datas)
             LOGINFO(f"{star_id}: {N_lcfiles} light curves found.")
             time, flux = preprocess_lightcurve(datas, hdrs, mission, inject_dict=inject_dict)
@@ -86,9 +89,10 @@ def main():
     # ^^^ END EXACT DUPLICATE ^^^
     ########################################################################
 
-    sel = np.isfinite(time) & np.isfinite(flux)
-    ftime, fflux = time[sel], flux[sel]
+    ftime, fflux = select_finite(time, flux)
     LS_Prot = get_LS_Prot(ftime, fflux)
+    if not np.isfinite(LS_Prot):
+        LS_Prot = None # baseline too short to measure; trimmean's default
 
     if method == 'itergaussian':
         pg_results = iterative_gaussian_whitening(x, y)
@@ -98,7 +102,7 @@ def main():
         raise ValueError(f"Unknown method: {method}. Use 'itergaussian' or 'trimmean'.")
 
     # Read the whitened periodogram results; recalculate best-fit model params
-    max_key = max(np.array(list(pg_results.keys())))
+    max_key = max(pg_results)
     peak_period = pg_results[max_key]['peak_period']
     res = pbls_search(ftime, fflux, np.array([peak_period]), durations_hr, poly_order)
 
@@ -135,10 +139,8 @@ def main():
         pickle.dump(result, f)
     LOGINFO(f"Wrote merged post-processed periodogram to {outpickle}")
 
-    lines = ['period,power\n'] + [f"{period},{power}\n" for period, power in zip(x, post_power)]
     outcsv = join(outprocessingdir, f'{star_id}_merged_postprocessed_pbls_periodogram_iter{iter_ix}.csv')
-    with open(outcsv, 'w') as f:
-        f.writelines(lines)
+    pd.DataFrame({'period': x, 'power': post_power}).to_csv(outcsv, index=False)
     LOGINFO(f"Wrote merged post-processed periodogram to {outcsv}")
     LOGINFO(bp)
 
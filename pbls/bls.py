@@ -1,7 +1,15 @@
+import math
+import warnings
 import numpy as np
+import numba
+from numba import prange, cuda
+from pbls.period_grids import generate_Ofir2014_period_grid
 
 def box_least_squares(time, flux, min_period, max_period, period_step, 
-                      min_duration, max_duration, duration_step, epoch_steps=100):
+                      min_duration, max_duration, duration_step, epoch_steps=100,
+                      nworkers=None, device='cpu', period_grid='uniform',
+                      R_star=1.0, M_star=1.0, oversampling_factor=3.0,
+                      precision='double'):
     """
     Perform the Box Least Squares (BLS) algorithm to search for periodic transit signals.
     
@@ -13,13 +21,37 @@ def box_least_squares(time, flux, min_period, max_period, period_step,
         min_period, max_period : float
             Search range for the transit period.
         period_step : float
-            Increment step for trial periods.
+            Increment step for trial periods (uniform grid only).
         min_duration, max_duration : float
             Range of transit durations to test (expressed as a fraction of the period).
         duration_step : float
             Increment step for trial durations.
         epoch_steps : int, optional
             Number of trial transit start positions (epochs) to test for each period-duration combination.
+        nworkers : int, optional
+            Number of threads the trial periods are spread over.  Defaults to
+            numba's thread count (all cores, unless NUMBA_NUM_THREADS is set).
+        device : str, optional
+            'cpu' (default) or 'cuda'.  'cuda' evaluates every (period,
+            duration, epoch) trial in its own GPU thread via numba.cuda, and
+            falls back to the CPU kernel if no GPU is available.
+        period_grid : str, optional
+            'uniform' (default): np.arange(min_period, max_period, period_step).
+            'ofir': the Ofir (2014) grid, uniform in f^(1/3), which matches
+            the frequency step to the transit duration (T_dur ∝ P^(1/3)) and
+            needs far fewer trials at long periods.  See
+            pbls.period_grids.generate_Ofir2014_period_grid; max_period is
+            also clamped to half the time baseline.
+        R_star, M_star, oversampling_factor : float, optional
+            Stellar radius and mass (solar units) and oversampling for the
+            'ofir' grid.
+        precision : str, optional
+            'double' (default) or 'single'.  'single' keeps the folded flux
+            buffers of the CPU kernel in float32, halving their memory
+            traffic; the prefix sums and the SNR are still accumulated in
+            float64, and time and phase always stay float64 (a float32 BJD
+            resolves only ~0.25 d).  Powers then agree with 'double' to
+            ~1e-6 relative.
             
     Returns:
         dict
@@ -32,62 +64,67 @@ def box_least_squares(time, flux, min_period, max_period, period_step,
                 'periods': Array of trial periods.
                 'power': Array of maximum detection statistic for each trial period.
     """
+    time = np.ascontiguousarray(time, dtype=np.float64)
+    flux = np.ascontiguousarray(flux, dtype=np.float64)
+
+    # Create vector for trial periods and corresponding periodogram power
+    if period_grid == 'uniform':
+        periods = np.arange(min_period, max_period, period_step)
+    elif period_grid == 'ofir':
+        periods = generate_Ofir2014_period_grid(
+            np.ptp(time), R_star=R_star, M_star=M_star,
+            period_min=min_period, clamp_period_max=max_period,
+            oversampling_factor=oversampling_factor
+        )
+    else:
+        raise ValueError(f"Unknown period_grid '{period_grid}'")
+    durations = np.arange(min_duration, max_duration, duration_step)
+    if precision not in ('double', 'single'):
+        raise ValueError(f"Unknown precision '{precision}'")
+
+    if device == 'cuda' and not cuda.is_available():
+        warnings.warn("box_least_squares: no CUDA device available; using the CPU.")
+        device = 'cpu'
+
+    if device == 'cuda':
+        power_array, per_duration, per_epoch, per_depth = _bls_cuda(
+            time, flux, periods, durations, epoch_steps
+        )
+    else:
+        prev_nthreads = numba.get_num_threads()
+        if nworkers is not None:
+            numba.set_num_threads(max(1, min(int(nworkers), numba.config.NUMBA_NUM_THREADS)))
+        try:
+            # a few period blocks per thread, for load balance
+            n_blocks = min(len(periods), 4 * numba.get_num_threads())
+            # Depth and variance are shift-invariant; centering the flux (in
+            # float64, before any narrowing) keeps the prefix sums of
+            # squares from cancelling catastrophically.
+            fc = flux - flux.mean() if len(flux) else flux
+            if precision == 'single':
+                fc = fc.astype(np.float32)
+            power_array, per_duration, per_epoch, per_depth = _bls_kernel(
+                time, fc, periods, durations, epoch_steps, n_blocks
+            )
+        finally:
+            numba.set_num_threads(prev_nthreads)
+
+    # Global best: the first period attaining the maximum, as in a serial
+    # loop with a strict ">" update.
     best_snr = -np.inf
     best_period = None
     best_duration = None
     best_epoch = None
     best_depth = None
-    
-    # Create vector for trial periods and corresponding periodogram power
-    periods = np.arange(min_period, max_period, period_step)
-    power_list = []
+    if len(periods) > 0:
+        best_ix = int(np.argmax(power_array))
+        if power_array[best_ix] > -np.inf:
+            best_snr = power_array[best_ix]
+            best_period = periods[best_ix]
+            best_duration = per_duration[best_ix]
+            best_epoch = per_epoch[best_ix]
+            best_depth = per_depth[best_ix]
 
-    durations = np.arange(min_duration, max_duration, duration_step)
-    
-    # Loop over trial periods
-    for trial_period in periods:
-        period_max_snr = -np.inf
-        # Compute the phase for each time point
-        phase = (time % trial_period) / trial_period
-        sorted_indices = np.argsort(phase)
-        phase_sorted = phase[sorted_indices]
-        flux_sorted = flux[sorted_indices]
-        
-        # Loop over trial durations and epochs
-        for trial_duration in durations:
-            # Define a grid of possible transit start epochs
-            epochs = np.linspace(0, 1 - trial_duration, epoch_steps)
-            for epoch in epochs:
-                in_transit_mask = (phase_sorted >= epoch) & (phase_sorted < (epoch + trial_duration))
-                if np.sum(in_transit_mask) == 0 or np.sum(~in_transit_mask) == 0:
-                    continue  # Skip if there are no points in or out of transit
-                
-                in_transit_flux = flux_sorted[in_transit_mask]
-                out_transit_flux = flux_sorted[~in_transit_mask]
-                
-                # Estimate transit depth as the difference between out-of-transit and in-transit means
-                transit_depth = np.mean(out_transit_flux) - np.mean(in_transit_flux)
-                
-                # Compute the signal-to-noise ratio (SNR)
-                snr = transit_depth / np.sqrt(np.var(in_transit_flux) / np.sum(in_transit_mask) +
-                                               np.var(out_transit_flux) / np.sum(~in_transit_mask))
-                
-                # Update the maximum SNR for this trial period
-                if snr > period_max_snr:
-                    period_max_snr = snr
-                
-                # Update global best if necessary
-                if snr > best_snr:
-                    best_snr = snr
-                    best_period = trial_period
-                    best_duration = trial_duration
-                    best_epoch = epoch
-                    best_depth = transit_depth
-        
-        power_list.append(period_max_snr)
-    
-    power_array = np.array(power_list)
-    
     return {
         'best_period': best_period,
         'best_duration': best_duration,
@@ -97,3 +134,314 @@ def box_least_squares(time, flux, min_period, max_period, period_step,
         'periods': periods,
         'power': power_array
     }
+
+
+@numba.njit(cache=True)
+def _fold_into_bins(phase, f, n_bins, bin_start, ph_b, f_b, cs, css,
+                    bin_idx, cursor):
+    """
+    Counting sort of the samples into n_bins equal-width phase bins: O(N),
+    with no argsort.  On return bin b holds the samples
+    [bin_start[b], bin_start[b+1]) of ph_b and f_b (in no particular order
+    within the bin), and cs, css are prefix sums of f_b and f_b**2.
+    bin_idx (length N) and cursor (length n_bins) are scratch.
+    """
+    N = phase.shape[0]
+    for b in range(n_bins + 1):
+        bin_start[b] = 0
+    for ii in range(N):
+        b = min(int(phase[ii] * n_bins), n_bins - 1)
+        bin_idx[ii] = b
+        bin_start[b + 1] += 1
+    for b in range(n_bins):
+        bin_start[b + 1] += bin_start[b]
+
+    for b in range(n_bins):
+        cursor[b] = bin_start[b]
+    for ii in range(N):
+        b = bin_idx[ii]
+        jj = cursor[b]
+        ph_b[jj] = phase[ii]
+        f_b[jj] = f[ii]
+        cursor[b] = jj + 1
+
+    cs[0] = 0.0
+    css[0] = 0.0
+    for jj in range(N):
+        v = float(f_b[jj])  # widen float32 flux before accumulating
+        cs[jj + 1] = cs[jj] + v
+        css[jj + 1] = css[jj] + v * v
+
+
+@numba.njit(cache=True)
+def _epoch_edges(durations, epoch_steps, n_bins):
+    """
+    Window edges [lo, hi) = [epoch, epoch + duration) of every (duration,
+    epoch) trial, and the phase bin each edge falls in.  They do not depend
+    on the trial period, so they are tabulated once per search.
+
+    The epoch grid is bit-identical to np.linspace(0, 1 - duration,
+    epoch_steps).  (Under parallel=True numba's own linspace rounds
+    differently, which moves epochs by an ulp and, with evenly sampled data,
+    points across the window edges.)
+    """
+    D = durations.shape[0]
+    lo = np.empty((D, epoch_steps))
+    hi = np.empty((D, epoch_steps))
+    b_lo = np.empty((D, epoch_steps), dtype=np.int64)
+    b_hi = np.empty((D, epoch_steps), dtype=np.int64)
+    for j in range(D):
+        trial_duration = durations[j]
+        epoch_stop = 1.0 - trial_duration
+        epoch_step = epoch_stop / max(epoch_steps - 1, 1)
+        for k in range(epoch_steps):
+            epoch = k * epoch_step
+            if k > 0 and k == epoch_steps - 1:
+                epoch = epoch_stop
+            lo[j, k] = epoch
+            hi[j, k] = epoch + trial_duration
+            b_lo[j, k] = int(lo[j, k] * n_bins)
+            b_hi[j, k] = int(hi[j, k] * n_bins)
+    return lo, hi, b_lo, b_hi
+
+
+@numba.njit(cache=True)
+def _stats_below(x, b, n_bins, bin_start, ph_b, f_b, cs, css):
+    """
+    Count, sum and sum of squares of the folded samples with phase < x,
+    where b = int(x * n_bins) is x's bin.
+
+    Every sample in a bin below x's bin has phase < x and every sample in a
+    bin above it has phase >= x, so only x's own bin is scanned.
+    """
+    N = ph_b.shape[0]
+    if b >= n_bins:
+        return N, cs[N], css[N]
+    a = bin_start[b]
+    n = a
+    s = cs[a]
+    q = css[a]
+    for jj in range(a, bin_start[b + 1]):
+        if ph_b[jj] < x:
+            n += 1
+            v = float(f_b[jj])
+            s += v
+            q += v * v
+    return n, s, q
+
+
+@numba.njit(parallel=True, cache=True)
+def _bls_kernel(time, fc, periods, durations, epoch_steps, n_blocks):
+    """
+    Numba kernel behind box_least_squares; parallelizes over trial periods.
+
+    For each period the light curve is phase-folded once into a grid of
+    ~N phase bins by counting sort (O(N), no argsort), and prefix sums of the
+    binned flux and squared flux are built.  The in-transit mean and
+    variance of any epoch window then follow from a prefix lookup and a scan
+    of one bin at each edge, rather than from a boolean mask over every
+    point.  The window edges are exact, not rounded to the bin grid.
+
+    The periods are split into n_blocks contiguous blocks, and the fold
+    buffers are allocated once per block and reused for every period in
+    it, rather than once per period.
+
+    No fastmath: evenly sampled data put many phases exactly on the window
+    edges, and reassociating e.g. `epoch + duration` moves them across
+    (the kernel would then disagree with the CUDA path).
+
+    fc is the mean-centred flux, float64 or float32; either way the prefix
+    sums cs, css are float64.
+
+    Returns (power, best_duration, best_epoch, best_depth), each of length
+    len(periods).
+    """
+    P = periods.shape[0]
+    D = durations.shape[0]
+    N = time.shape[0]
+    power = np.empty(P)
+    per_duration = np.empty(P)
+    per_epoch = np.empty(P)
+    per_depth = np.empty(P)
+
+    n_bins = max(N, 1)
+    lo, hi, b_lo, b_hi = _epoch_edges(durations, epoch_steps, n_bins)
+
+    for c in prange(n_blocks):
+        phase = np.empty(N)
+        bin_start = np.empty(n_bins + 1, dtype=np.int64)
+        ph_b = np.empty(N)
+        f_b = np.empty_like(fc)
+        cs = np.empty(N + 1)
+        css = np.empty(N + 1)
+        bin_idx = np.empty(N, dtype=np.int64)
+        cursor = np.empty(n_bins, dtype=np.int64)
+
+        for i in range(c * P // n_blocks, (c + 1) * P // n_blocks):
+            trial_period = periods[i]
+            for ii in range(N):
+                phase[ii] = (time[ii] % trial_period) / trial_period
+
+            _fold_into_bins(phase, fc, n_bins, bin_start, ph_b, f_b, cs, css,
+                            bin_idx, cursor)
+            tot = cs[N]
+            totsq = css[N]
+
+            period_max_snr = -np.inf
+            period_duration = np.nan
+            period_epoch = np.nan
+            period_depth = np.nan
+            for j in range(D):
+                for k in range(epoch_steps):
+                    # in transit: lo <= phase < hi
+                    n_lo, s_lo, q_lo = _stats_below(
+                        lo[j, k], b_lo[j, k], n_bins, bin_start, ph_b, f_b, cs, css)
+                    n_hi, s_hi, q_hi = _stats_below(
+                        hi[j, k], b_hi[j, k], n_bins, bin_start, ph_b, f_b, cs, css)
+                    n_in = n_hi - n_lo
+                    n_out = N - n_in
+                    if n_in == 0 or n_out == 0:
+                        continue  # Skip if there are no points in or out of transit
+
+                    s_in = s_hi - s_lo
+                    q_in = q_hi - q_lo
+                    mean_in = s_in / n_in
+                    mean_out = (tot - s_in) / n_out
+                    var_in = max(q_in / n_in - mean_in * mean_in, 0.0)
+                    var_out = max((totsq - q_in) / n_out - mean_out * mean_out, 0.0)
+
+                    # Estimate transit depth as the difference between
+                    # out-of-transit and in-transit means, and its SNR
+                    transit_depth = mean_out - mean_in
+                    snr = transit_depth / np.sqrt(var_in / n_in + var_out / n_out)
+
+                    if snr > period_max_snr:
+                        period_max_snr = snr
+                        period_duration = durations[j]
+                        period_epoch = lo[j, k]
+                        period_depth = transit_depth
+
+            power[i] = period_max_snr
+            per_duration[i] = period_duration
+            per_epoch[i] = period_epoch
+            per_depth[i] = period_depth
+
+    return power, per_duration, per_epoch, per_depth
+
+
+_cuda_trial_kernel = None
+
+def _get_cuda_trial_kernel():
+    """Compile (once) the per-trial CUDA kernel used by _bls_cuda."""
+    global _cuda_trial_kernel
+    if _cuda_trial_kernel is not None:
+        return _cuda_trial_kernel
+
+    @cuda.jit
+    def _kernel(time, fc, tot, totsq, periods, durations, epoch_steps,
+                snr_out, depth_out):
+        # one thread per (period, duration, epoch) trial, in C order
+        ix = cuda.grid(1)
+        D = durations.shape[0]
+        E = epoch_steps
+        if ix >= periods.shape[0] * D * E:
+            return
+        i = ix // (D * E)
+        j = (ix // E) % D
+        k = ix % E
+        trial_period = periods[i]
+        trial_duration = durations[j]
+        epoch_stop = 1.0 - trial_duration
+        epoch = k * (epoch_stop / max(E - 1, 1))
+        if k > 0 and k == E - 1:
+            epoch = epoch_stop
+        epoch_end = epoch + trial_duration
+
+        N = time.shape[0]
+        n_in = 0
+        s_in = 0.0
+        q_in = 0.0
+        for ii in range(N):
+            phase = (time[ii] % trial_period) / trial_period
+            if phase >= epoch and phase < epoch_end:
+                f = fc[ii]
+                n_in += 1
+                s_in += f
+                q_in += f * f
+        n_out = N - n_in
+        if n_in == 0 or n_out == 0:
+            snr_out[ix] = -math.inf
+            depth_out[ix] = math.nan
+            return
+        mean_in = s_in / n_in
+        mean_out = (tot - s_in) / n_out
+        var_in = max(q_in / n_in - mean_in * mean_in, 0.0)
+        var_out = max((totsq - q_in) / n_out - mean_out * mean_out, 0.0)
+        depth = mean_out - mean_in
+        snr_out[ix] = depth / math.sqrt(var_in / n_in + var_out / n_out)
+        depth_out[ix] = depth
+
+    _cuda_trial_kernel = _kernel
+    return _kernel
+
+
+def _bls_cuda(time, flux, periods, durations, epoch_steps,
+              max_trials_per_launch=2**24, threads_per_block=128):
+    """
+    GPU counterpart of _bls_kernel, with the same return values.
+
+    Each trial is a thread that streams the whole light curve from global
+    memory; the SNR grid is copied back and reduced to per-period maxima on
+    the host in the same (duration, epoch) order as the CPU kernel.  Periods
+    are processed in batches of at most max_trials_per_launch trials.
+    """
+    kernel = _get_cuda_trial_kernel()
+
+    P = len(periods)
+    D = len(durations)
+    E = epoch_steps
+    fc = flux - np.mean(flux)
+    tot = float(np.sum(fc))
+    totsq = float(np.sum(fc * fc))
+    d_time = cuda.to_device(time)
+    d_fc = cuda.to_device(fc)
+    d_durations = cuda.to_device(durations)
+
+    power = np.full(P, -np.inf)
+    per_duration = np.full(P, np.nan)
+    per_epoch = np.full(P, np.nan)
+    per_depth = np.full(P, np.nan)
+
+    batch = max(1, max_trials_per_launch // max(D * E, 1))
+    for p0 in range(0, P, batch):
+        p1 = min(P, p0 + batch)
+        n_trials = (p1 - p0) * D * E
+        if n_trials == 0:
+            continue
+        d_snr = cuda.device_array(n_trials)
+        d_depth = cuda.device_array(n_trials)
+        blocks = (n_trials + threads_per_block - 1) // threads_per_block
+        kernel[blocks, threads_per_block](
+            d_time, d_fc, tot, totsq, cuda.to_device(periods[p0:p1]),
+            d_durations, E, d_snr, d_depth
+        )
+        snr = d_snr.copy_to_host().reshape(p1 - p0, D * E)
+        depth = d_depth.copy_to_host().reshape(p1 - p0, D * E)
+
+        # first maximum in (duration, epoch) order; NaN SNRs never win
+        snr[np.isnan(snr)] = -np.inf
+        jk = np.argmax(snr, axis=1)
+        rows = np.arange(p1 - p0)
+        best = snr[rows, jk]
+        ok = best > -np.inf
+        j, k = np.divmod(jk, E)
+        epoch_stop = 1.0 - durations[j]
+        epoch = k * (epoch_stop / max(E - 1, 1))
+        epoch = np.where((k > 0) & (k == E - 1), epoch_stop, epoch)
+
+        power[p0:p1] = best
+        per_duration[p0:p1] = np.where(ok, durations[j], np.nan)
+        per_epoch[p0:p1] = np.where(ok, epoch, np.nan)
+        per_depth[p0:p1] = np.where(ok, depth[rows, jk], np.nan)
+
+    return power, per_duration, per_epoch, per_depth
@@ -40,14 +40,20 @@ LOGEXCEPTION = LOGGER.exception
 #############
 ## IMPORTS ##
 #############
+import io
 import os
-from glob import glob
+import re
+import json
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
 from astropy.io import fits
 from os.path import join
+try:
+    import fitsio # optional: cfitsio-backed, faster table & header reads
+except ImportError:
+    fitsio = None
 import numpy as np
 
-from pbls.pipeline_utils import extract_tarball
-
 # hard cache for common cases
 NAME_TO_TICID = {
     'HIP 67522': '166527623',
@@ -63,23 +69,161 @@ NAME_TO_KICID = {
     'Kepler-1975': '8873450',
 }
 
-def get_OSG_local_fits_lightcurve(star_id):
+# (mission, author, cadence) products whose lightkurve cache layout
+# fast_get_mast_lightcurve can glob directly, and their filename prefix
+_MAST_CACHE_PREFIX = {
+    ('TESS', 'SPOC', 120): 'tess',
+    ('Kepler', 'Kepler', 1800): 'kplr',
+}
+TARGET_ID_CACHE = 'pbls_target_ids.json'
+
+def _scan_dir(dirpath, prefix, contains, suffix, dirs=False):
+    """
+    Sorted paths in dirpath matching the glob `{prefix}*{contains}*{suffix}`
+    (files, or directories if dirs=True).  One os.scandir with C-level
+    string tests, in place of glob's per-entry fnmatch regex.
+    """
+    lo = len(prefix)
+    matches = []
+    try:
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                name = entry.name
+                hi = len(name) - len(suffix)
+                if (hi >= lo and name.startswith(prefix)
+                        and name.endswith(suffix)
+                        and contains in name[lo:hi]
+                        and entry.is_dir() == dirs):
+                    matches.append(entry.path)
+    except FileNotFoundError:
+        pass
+    matches.sort()
+    return matches
+
+
+def _mast_name_match(prefix, target_id):
+    """(name prefix, infix) that lightkurve cache entries for target_id have:
+    MAST names hold the zero-padded ID, so matching it exactly means e.g.
+    KIC 6184894 does not also pick up kplr016184894."""
+    if prefix == 'tess':
+        # tess2018206045859-s0001-0000000025155310-0120-s[_lc.fits]
+        return prefix, f'-{int(target_id):016d}-'
+    # kplr006184894_lc_Q111..., kplr006184894-2009131105131_llc.fits
+    return f'{prefix}{int(target_id):09d}', ''
+
+
+def _glob_mast_cache(cache_dir, mission, prefix, target_id):
+    """Sorted light-curve FITS paths for target_id in the lightkurve cache,
+    i.e. `mastDownload/{mission}/{prefix}*{id}*/{prefix}*{id}*.fits`, with
+    the ID matched zero-padded as MAST writes it."""
+    name_prefix, infix = _mast_name_match(prefix, target_id)
+    lcfiles = []
+    for subdir in _scan_dir(join(cache_dir, 'mastDownload', mission),
+                            name_prefix, infix, '', dirs=True):
+        lcfiles.extend(_scan_dir(subdir, name_prefix, infix, '.fits'))
+    lcfiles.sort()
+    return lcfiles
+
+
+def _load_target_ids(cache_dir):
+    """'{mission}:{star_id}' -> TIC/KIC ID resolved by earlier searches."""
+    path = join(cache_dir, TARGET_ID_CACHE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _save_target_id(cache_dir, key, target_id):
+    target_ids = _load_target_ids(cache_dir)
+    if target_ids.get(key, None) == target_id:
+        return
+    target_ids[key] = target_id
+    path = join(cache_dir, TARGET_ID_CACHE)
+    tmppath = f'{path}.{os.getpid()}.tmp'
+    with open(tmppath, 'w') as f:
+        json.dump(target_ids, f, indent=1, sort_keys=True)
+    os.replace(tmppath, path)
+
+
+def _read_lightcurve_fits(lcfiles, max_workers=8, columns=None):
+    """
+    Open each light-curve FITS file and return its table data (hdul[1].data)
+    and primary header (hdul[0].header), as two lists in the order of lcfiles.
+    Each entry of lcfiles is a path, or the bytes of a FITS file already read
+    into memory.  If `columns` is given, only those table columns are read, into a plain
+    structured array.
+
+    The files are opened in a thread pool, since the cost is mostly open()
+    and header parsing.  If fitsio is installed it reads just the table (a
+    structured ndarray with the same column names) and the header;
+    otherwise astropy memory-maps the table, so its bytes are paged in on
+    use rather than copied up front.
+    """
+    def _read(f):
+        if fitsio is not None and isinstance(f, str):
+            # column-selective read: the other columns are never loaded
+            with fitsio.FITS(f) as h:
+                return h[1].read(columns=columns), h[0].read_header()
+        if isinstance(f, bytes):
+            # file contents already in memory
+            hdul = fits.open(io.BytesIO(f), memmap=False)
+        else:
+            hdul = fits.open(f, memmap=True)
+        if columns is None:
+            return hdul[1].data, hdul[0].header
+        # Copy just the wanted columns out of the memory map (only their
+        # pages are touched) and close the file, rather than holding every
+        # light curve's full table and file handle open.
+        with hdul:
+            table = hdul[1].data
+            data = np.empty(
+                len(table), dtype=[(c, table[c].dtype) for c in columns]
+            )
+            for c in columns:
+                data[c] = table[c]
+            return data, hdul[0].header
+
+    if len(lcfiles) <= 1:
+        results = [_read(f) for f in lcfiles]
+    else:
+        n_workers = min(max_workers, len(lcfiles))
+        with ThreadPoolExecutor(max_workers=n_workers) as ex:
+            results = list(ex.map(_read, lcfiles)) # map keeps the file order
+
+    data = [d for d, _ in results]
+    hdrs = [h for _, h in results]
+    return data, hdrs
+
+
+def get_OSG_local_fits_lightcurve(star_id, columns=None):
 
     # Pre-tarred light curves are passed as tarball via HTCondor.
     tarballpath = f"./{star_id}.tar.gz"
-    extractpath = "./"
-    extract_tarball(tarballpath, extractpath)
+
+    # Read the light curves straight out of the tarball, in name order, rather
+    # than extracting them to scratch and reading them back.  (Extracted
+    # files would also be shipped back with the job's output.)
+    with tarfile.open(tarballpath, "r:gz") as tar:
+        lcbufs = [
+            (member.name, tar.extractfile(member).read())
+            for member in tar
+            if member.isfile() and _is_lcfile_member(member.name, star_id)
+        ]
+    lcbufs.sort(key=lambda nb: os.path.basename(nb[0]))
 
     # Read data and headers
-    lcfiles = np.sort(glob(f"{star_id}*.fits"))
-    data = []
-    hdrs = []
-    for f in lcfiles:
-        hdul = fits.open(f)
-        data.append(hdul[1].data)
-        hdrs.append(hdul[0].header)
+    return _read_lightcurve_fits([buf for _, buf in lcbufs], columns=columns)
 
-    return data, hdrs
+
+def _is_lcfile_member(name, star_id):
+    """Top-level {star_id}*.fits archive member (those extraction to ./ and
+    a scan of ./ would have found)."""
+    name = os.path.normpath(name)
+    return (
+        os.path.dirname(name) == ''
+        and name.startswith(star_id) and name.endswith('.fits')
+    )
 
     
 def get_OSG_local_csv_lightcurve(star_id, iter_ix=0):
@@ -92,15 +236,63 @@ def get_OSG_local_csv_lightcurve(star_id, iter_ix=0):
     # CSV light curves are passed via HTCondor through the DAGman.
     csvpath = f"./{star_id}_masked_lightcurve_iter{iter_ix}.csv"
 
-    import pandas as pd
+    # Parse only the columns used, straight to float64, without pandas.
+    # NaN points may be written as empty fields; read them back as NaN.
+    with open(csvpath) as f:
+        header = f.readline().rstrip('\n').split(',')
+    usecols = tuple(
+        header.index(c) for c in ('time', 'flux_original', 'in_transit')
+    )
+    data = np.loadtxt(
+        csvpath, delimiter=',', skiprows=1, usecols=usecols,
+        dtype=np.float64, converters=_float_or_nan, ndmin=2
+    )
 
-    df = pd.read_csv(csvpath)
-    time = np.array(df['time_masked'])
-    flux = np.array(df['flux_masked'])
+    # The masked light curve: NaN time and flux where in transit.
+    in_transit = data[:, 2] != 0
+    time = np.where(in_transit, np.nan, data[:, 0])
+    flux = np.where(in_transit, np.nan, data[:, 1])
 
     return time, flux
 
 
+def _float_or_nan(field):
+    return float(field or 'nan')
+
+
+def _make_cache_dir(cache_dir):
+    assert isinstance(cache_dir, str)
+    # Ensure cache directory exists if provided
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+def _search_mast(star_id, mission, cadence, author):
+    """Search MAST for light curves with the given mission, cadence, author.
+    lightkurve (slow to import: it pulls in astroquery) is imported only
+    here, so cache hits never load it."""
+
+    import lightkurve as lk
+
+    return lk.search_lightcurve(
+        star_id,
+        mission=mission,
+        cadence=cadence,
+        author=author
+    )
+
+
+def _download_mast(search_result, cache_dir):
+    """Download all light curves in search_result; return sorted paths."""
+    # The files are re-read from these paths, not from lc_collection: the
+    # LightCurve objects keep only lightkurve's converted columns (renamed,
+    # time as astropy Time) plus header keywords in .meta, not the HDUs, so
+    # the raw tables and headers the pipeline expects are not in memory.
+    # The re-read is of files just written, so is served from page cache.
+    lc_collection = search_result.download_all(download_dir=cache_dir)
+    return np.sort([obj.meta['FILENAME'] for obj in lc_collection])
+
+
 def get_tess_data(star_id, cache_dir=None):
     """
     Download TESS SPOC 120-second cadence light curves for a given star.
@@ -128,7 +320,8 @@ def get_tess_data(star_id, cache_dir=None):
     )
 
     
-def fast_get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC', cache_dir=None):
+def fast_get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC', cache_dir=None,
+                             columns=None):
     """
     Download MAST light curves via Lightkurve for a given star.
 
@@ -146,6 +339,9 @@ def fast_get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC'
         Pipeline or author tag (e.g., 'SPOC', 'EVEREST', 'Kepler'). Default is 'SPOC'.
     cache_dir : str, optional
         Directory to cache downloaded FITS files. If None, default lightkurve cache is used.
+    columns : list of str, optional
+        Table columns to read (e.g. lc_processing.LC_COLUMNS[mission]).
+        Default is all columns.
 
     Returns
     -------
@@ -155,56 +351,50 @@ def fast_get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC'
         List of FITS primary headers (hdul[0].header).
     """
 
-    import lightkurve as lk
-
-    assert isinstance(cache_dir, str)
-    # Ensure cache directory exists if provided
-    if cache_dir:
-        os.makedirs(cache_dir, exist_ok=True)
+    _make_cache_dir(cache_dir)
 
-    # Check if TESS data were already downloaded.
+    # Check if the light curves were already downloaded.  The target ID
+    # comes from the hard cache, else from the ID cache that earlier
+    # searches wrote to cache_dir, so a warm run makes no MAST request.
     lcfiles = []
-    if mission == 'TESS' and author == 'SPOC' and cadence == 120:
-        ticid = NAME_TO_TICID.get(star_id, None)
-        if ticid is None:
-            pass
-        else:
-            lcfiles = np.sort(glob(join(cache_dir, 'mastDownload', 'TESS', f'tess*{ticid}*', f'tess*{ticid}*.fits')))
-
-    elif mission == 'Kepler' and author == 'Kepler' and cadence == 1800:
-        kicid = NAME_TO_KICID.get(star_id, None)
-        if kicid is None:
-            pass
-        else:
-            lcfiles = np.sort(glob(join(cache_dir, 'mastDownload', 'Kepler', f'kplr*{kicid}*', f'kplr*{kicid}*.fits')))
+    prefix = _MAST_CACHE_PREFIX.get((mission, author, cadence), None)
+    if prefix is not None:
+        hard_cache = NAME_TO_TICID if prefix == 'tess' else NAME_TO_KICID
+        target_id = hard_cache.get(star_id, None)
+        if target_id is None:
+            target_id = _load_target_ids(cache_dir).get(f'{mission}:{star_id}', None)
+        if target_id is not None:
+            lcfiles = _glob_mast_cache(cache_dir, mission, prefix, target_id)
 
-        
     if len(lcfiles) == 0:
-        search_result = lk.search_lightcurve(
-            star_id,
-            mission=mission,
-            cadence=cadence,
-            author=author
-        )
+        search_result = _search_mast(star_id, mission, cadence, author)
 
         if len(search_result) == 0:
             return [], []
 
-        # Download all light curves
-        lc_collection = search_result.download_all(download_dir=cache_dir)
-        lcfiles = np.sort([obj.meta['FILENAME'] for obj in lc_collection])
+        # Resolve the target ID once and remember it; if every product the
+        # search lists is already in the cache, skip download_all (which
+        # still queries MAST for each product before reading the cache).
+        if prefix is not None:
+            target_ids = {
+                re.sub(r'\D', '', str(name)).lstrip('0')
+                for name in search_result.table['target_name']
+            }
+            if len(target_ids) == 1 and '' not in target_ids:
+                target_id = target_ids.pop()
+                _save_target_id(cache_dir, f'{mission}:{star_id}', target_id)
+                lcfiles = _glob_mast_cache(cache_dir, mission, prefix, target_id)
+                if len(lcfiles) < len(search_result):
+                    lcfiles = []
+
+        if len(lcfiles) == 0:
+            lcfiles = _download_mast(search_result, cache_dir)
 
     # Read data and headers
-    data = []
-    hdrs = []
-    for f in lcfiles:
-        hdul = fits.open(f)
-        data.append(hdul[1].data)
-        hdrs.append(hdul[0].header)
-
-    return data, hdrs
+    return _read_lightcurve_fits(lcfiles, columns=columns)
 
-def get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC', cache_dir=None):
+def get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC', cache_dir=None,
+                        columns=None):
     """
     Download MAST light curves via Lightkurve for a given star.
 
@@ -222,6 +412,9 @@ def get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC', cac
         Pipeline or author tag (e.g., 'SPOC', 'EVEREST', 'Kepler'). Default is 'SPOC'.
     cache_dir : str, optional
         Directory to cache downloaded FITS files. If None, default lightkurve cache is used.
+    columns : list of str, optional
+        Table columns to read (e.g. lc_processing.LC_COLUMNS[mission]).
+        Default is all columns.
 
     Returns
     -------
@@ -231,77 +424,66 @@ def get_mast_lightcurve(star_id, mission='TESS', cadence=120, author='SPOC', cac
         List of FITS primary headers (hdul[0].header).
     """
 
-    import lightkurve as lk
+    _make_cache_dir(cache_dir)
 
-    assert isinstance(cache_dir, str)
-    # Ensure cache directory exists if provided
-    if cache_dir:
-        os.makedirs(cache_dir, exist_ok=True)
-
-    # Search for data with specified mission, cadence, and author
-    search_result = lk.search_lightcurve(
-        star_id,
-        mission=mission,
-        cadence=cadence,
-        author=author
-    )
+    search_result = _search_mast(star_id, mission, cadence, author)
 
     if len(search_result) == 0:
         return [], []
 
-    # Download all light curves
-    lc_collection = search_result.download_all(download_dir=cache_dir)
-    lcfiles = np.sort([obj.meta['FILENAME'] for obj in lc_collection])
+    lcfiles = _download_mast(search_result, cache_dir)
 
     # Read data and headers
-    data = []
-    hdrs = []
-    for f in lcfiles:
-        hdul = fits.open(f)
-        data.append(hdul[1].data)
-        hdrs.append(hdul[0].header)
-
-    return data, hdrs
+    return _read_lightcurve_fits(lcfiles, columns=columns)
 
     
+# (substring, mission), checked in order by parse_star_id
+_MISSION_TAGS = (
+    ('kplr', 'Kepler'), ('Kepler-', 'Kepler'),
+    ('tess', 'TESS'), ('TOI-', 'TESS'),
+    ('_k2_', 'K2'), ('K2-', 'K2'),
+)
+
+# one "-"-separated injection parameter, e.g. "P10p5" -> ('P', '10p5')
+_INJECT_PARAM_RE = re.compile(r'(?:^|-)([PRTE])([^-]*)')
+_INJECT_KEYS = {'P': 'period', 'T': 'duration_hr', 'E': 'epoch', 'R': 'depth'}
+
+# hard Rstar cache for common cases
+# NOTE: this doesn't scale; if you want to inject on stars other than those
+# specified here, you'll need to estimate those stellar radii some other
+# way.
+TICID_RSTARS = {
+    '166527623': 1.38, # HIP 67522
+    '460205581': 1.022, # TOI-837
+    '441420236': 0.75, # AU Mic
+    '146520535': 1.022, # TOI-942
+    '120105470': 0.881, # Kepler-1627
+}
+KICID_RSTARS = {
+    '6184894': 0.881, # Kepler-1627
+    '8653134': 0.855,    # 'Kepler-1643': 
+    '10736489': 0.876,   # 'Kepler-1974' = KOI-7368
+    '8873450': 0.790,    # 'Kepler-1975' = KOI-7913A 
+}
+
 def parse_star_id(star_id):
 
     # get mission from star_id
-    if 'kplr' in star_id or 'Kepler-' in star_id:
-        mission = 'Kepler'
-    elif 'tess' in star_id or 'TOI-' in star_id:
-        mission = 'TESS'
-    elif '_k2_' in star_id or 'K2-' in star_id:
-        mission = 'K2'
+    for tag, mission in _MISSION_TAGS:
+        if tag in star_id:
+            break
+    else:
+        raise ValueError(f"Could not infer the mission from star_id '{star_id}'")
 
     # create injection dict if needed
     # star_id format in such cases:
     # "kplr12390401_inject-PXpXXX-RYpYYY-TZpZZZ-EXpXXX" for period, radius, duration, epoch.
     inject_dict = None
 
-    base_star_id = star_id
-
-    if '_inject-' in star_id:
-
-        # hard Rstar cache for common cases
-        # NOTE: this doesn't scale; if you want to inject on stars other than those
-        # specified here, you'll need to estimate those stellar radii some other
-        # way.
-        TICID_RSTARS = {
-            '166527623': 1.38, # HIP 67522
-            '460205581': 1.022, # TOI-837
-            '441420236': 0.75, # AU Mic
-            '146520535': 1.022, # TOI-942
-            '120105470': 0.881, # Kepler-1627
-        }
-        KICID_RSTARS = {
-            '6184894': 0.881, # Kepler-1627
-            '8653134': 0.855,    # 'Kepler-1643': 
-            '10736489': 0.876,   # 'Kepler-1974' = KOI-7368
-            '8873450': 0.790,    # 'Kepler-1975' = KOI-7913A 
-        }
-
-        base_star_id = star_id.split('_inject-')[0]
+    base_star_id, sep, inject_str = star_id.partition('_inject-')
+
+    if sep:
+
         if base_star_id.startswith('kplr'):
             # remove "kplr" and any leading zeros
             kicid = base_star_id[4:].lstrip('0')
@@ -311,20 +493,14 @@ def parse_star_id(star_id):
             raise NotImplementedError("Only Kepler injection parsing is implemented. "+
                                       "To do more, add Rstar logic here.")
 
-        inject_str = star_id.split('_inject-')[1]
-        inject_parts = inject_str.split('-')
         inject_dict = {}
-        for part in inject_parts:
-            if part.startswith('P'):
-                inject_dict['period'] = float(part[1:].replace('p', '.'))
-            elif part.startswith('T'):
-                inject_dict['duration_hr'] = float(part[1:].replace('p', '.'))
-            elif part.startswith('E'):
-                inject_dict['epoch'] = float(part[1:].replace('p', '.'))
-            elif part.startswith('R'):
-                Rp_earths = float(part[1:].replace('p', '.')) # units: Earth radii
-                inject_dict['depth'] = (Rp_earths / Rs_earths) ** 2
+        for key, value in _INJECT_PARAM_RE.findall(inject_str):
+            value = float(value.replace('p', '.'))
+            if key == 'R':
+                Rp_earths = value # units: Earth radii
+                value = (Rp_earths / Rs_earths) ** 2
+            inject_dict[_INJECT_KEYS[key]] = value
 
         LOGINFO(f"  Injection parameters: {inject_dict}")
 
-    return mission, inject_dict, base_star_id
\ No newline at end of file
+    return mission, inject_dict, base_star_id
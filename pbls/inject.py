@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import numpy as np
+from numba import njit
 from typing import Iterable
 
 def inject_transit(
@@ -29,10 +30,59 @@ def inject_transit(
     np.ndarray
         New flux array with the transit injected.
     """
-    t = np.asarray(time, dtype=float)
-    f = np.asarray(flux, dtype=float)
+    # no-ops for contiguous float64 input; otherwise one converting copy
+    # (so the ravels below are views, not a second copy)
+    t = np.asarray(time, dtype=np.float64, order='C')
+    f = np.asarray(flux, dtype=np.float64, order='C')
 
-    # Extract required parameters from inject_dict
+    period, duration_days, depth, t0 = _parse_inject_dict(inject_dict)
+
+    out = np.empty(f.shape)
+    _subtract_box_transit(t.ravel(), f.ravel(), period, duration_days, t0, depth, out.ravel())
+    return out
+
+
+def make_injector(time: Iterable[float]):
+    """
+    Build a box-transit injector specialized to a fixed time grid, for
+    injection-recovery loops that inject many parameter sets into the same
+    light curve.
+
+    The time grid is converted to a contiguous float64 array once, and the
+    output buffer is allocated once, so each call does no conversion or
+    allocation: only the compiled mask-and-subtract pass.
+
+    Parameters
+    ----------
+    time : array-like
+        Timestamps (days), fixed for every call of the returned injector.
+
+    Returns
+    -------
+    callable
+        ``inject(flux, inject_dict) -> np.ndarray``, equivalent to
+        ``inject_transit(time, flux, inject_dict)``.  The returned array is
+        the injector's own buffer and is overwritten by the next call; copy
+        it if it must outlive that call.
+    """
+    t = np.ascontiguousarray(time, dtype=np.float64).ravel()
+    out = np.empty(t.shape)
+
+    def inject(flux, inject_dict):
+        f = np.ascontiguousarray(flux, dtype=np.float64).ravel()
+        if f.shape != t.shape:
+            raise ValueError(
+                f"flux has {f.shape[0]} points; injector expects {t.shape[0]}"
+            )
+        period, duration_days, depth, t0 = _parse_inject_dict(inject_dict)
+        _subtract_box_transit(t, f, period, duration_days, t0, depth, out)
+        return out
+
+    return inject
+
+
+def _parse_inject_dict(inject_dict):
+    """Validate inject_dict; return (period, duration_days, depth, epoch)."""
     required = {"period", "duration_hr", "depth", "epoch"}
     missing = required - inject_dict.keys()
     if missing:
@@ -49,13 +99,20 @@ def inject_transit(
     if depth < 0:
         raise ValueError("depth must be >= 0")
 
-    duration_days = duration_hr / 24.0
-    t0 = epoch
+    return period, duration_hr / 24.0, depth, epoch
 
-    # Box-transit mask: points within half-duration of the nearest transit center.
-    # in_transit when phase distance from center < half duration.
-    in_transit = np.abs(((t - t0 + 0.5 * period) % period) - 0.5 * period) < 0.5 * duration_days
 
-    out = f.copy()
-    out[in_transit] -= depth
-    return out
\ No newline at end of file
+@njit(cache=True)
+def _subtract_box_transit(t, f, period, duration_days, t0, depth, out):
+    """
+    out = f, minus depth at the points within half a duration of the
+    nearest transit center: the mask and the subtraction in one pass.
+    """
+    half_P = 0.5 * period
+    half_Tdur = 0.5 * duration_days
+    for i in range(t.shape[0]):
+        # phase distance from the nearest transit center
+        if abs((t[i] - t0 + half_P) % period - half_P) < half_Tdur:
+            out[i] = f[i] - depth
+        else:
+            out[i] = f[i]
\ No newline at end of file
@@ -4,8 +4,11 @@ Standard light curve processing functions.
 Contents:
 * preprocess_lightcurve: Standard cleaning before PBLS (& optional transit injection).
 * get_LS_Prot: Measure rotation period via Lomb-Scargle peak given time and flux.
+* select_finite: Drop points where time or flux is not finite, in one pass.
+* slide_clip_mad: Compiled equivalent of wotan's MAD/median slide_clip.
 * time_bin_lightcurve: Bin the light curve in time with a fixed binsize.
 * transit_mask: Get transit mask given t, P, Tdur, t0
+* transit_masks: As above, for K (P, Tdur, t0) trials at once -> (N_t, K).
 * mask_top_pbls_peak: Read periodogram, mask in-transit points, save masked LC to CSV.
 """
 #############
@@ -39,45 +42,421 @@ LOGEXCEPTION = LOGGER.exception
 #############
 import socket, pickle
 import numpy as np, pandas as pd
+from numba import njit
 from os.path import join
 
 from astropy.timeseries import LombScargle
-from wotan import slide_clip
+try:
+    import pyarrow as pa, pyarrow.csv as pacsv # optional: fast CSV writes
+except ImportError:
+    pa = pacsv = None
+try:
+    import nifty_ls # optional: registers astropy's method='fastnifty' (FINUFFT)
+except ImportError:
+    nifty_ls = None
+
+# Lomb-Scargle method for get_LS_Prot: nifty-ls's NUFFT if installed, else
+# astropy's Press & Rybicki extirpolation.  Both need a regular grid.
+LS_METHOD = 'fastnifty' if nifty_ls is not None else 'fast'
+
+
+def _ls_method(device):
+    """(method, method_kwds) for LombScargle.power on the given device:
+    'cuda' runs nifty-ls's cufinufft backend, 'cpu' its finufft backend
+    (else astropy 'fast'), and 'auto' picks 'cuda' if cufinufft is usable."""
+    if device not in ('auto', 'cpu', 'cuda'):
+        raise ValueError(f"Unknown device '{device}'")
+    if nifty_ls is None:
+        if device == 'cuda':
+            LOGWARNING("get_LS_Prot: nifty-ls not installed; using the CPU.")
+        return LS_METHOD, None
+
+    from nifty_ls.core import AVAILABLE_BACKENDS
+    has_cuda = 'cufinufft' in AVAILABLE_BACKENDS
+    if device == 'cuda' and not has_cuda:
+        LOGWARNING("get_LS_Prot: no cufinufft/CUDA device available; using the CPU.")
+    if device != 'cpu' and has_cuda:
+        return LS_METHOD, {'backend': 'cufinufft'}
+    return LS_METHOD, {'backend': 'finufft'}
 
 from pbls.getters import (
     get_OSG_local_fits_lightcurve, get_OSG_local_csv_lightcurve, parse_star_id
 )
 
 
-def get_LS_Prot(time, flux, Prot_min=0.1, Prot_max=15., N_freq = 1_000_000, verbose=1):
-    """measure rotation period (via Lomb Scargle peak) from the light curve"""
+# The only table columns preprocess_lightcurve reads, per mission: pass as
+# `columns=` to the light-curve getters to skip reading the rest.
+LC_COLUMNS = {
+    'TESS': ['TIME', 'SAP_FLUX', 'QUALITY'],
+    'K2': ['TIME', 'FCOR'],
+    'Kepler': ['TIME', 'SAP_FLUX', 'SAP_QUALITY'],
+}
+
+
+def get_LS_Prot(time, flux, Prot_min=0.1, Prot_max=15., N_freq=2_000,
+                samples_per_peak=10, device='auto', verbose=1):
+    """measure rotation period (via Lomb Scargle peak) from the light curve
+
+    Coarse-to-fine: the peak is located on astropy's autofrequency grid
+    (samples_per_peak points per peak width 1/T), then refined on N_freq
+    points spanning the neighbouring coarse grid points, and the fine
+    maximum interpolated parabolically.  Both passes use
+    an O(N log N) method on the regular grid: nifty-ls's 'fastnifty' if it
+    is installed, else astropy's 'fast'.  device ('auto', 'cpu', 'cuda')
+    selects nifty-ls's cufinufft GPU backend ('auto': if available); time
+    and flux stay host float64 arrays, nifty-ls does the transfers.
+
+    Periods longer than half the baseline are not resolvable, so Prot_max
+    is capped at T_span/2; a baseline under 2*Prot_min returns NaN.
+    """
 
     time = np.array(time)
     flux = np.array(flux)
 
+    T_span = float(time.max() - time.min())
+    if T_span < 2 * Prot_min:
+        if verbose:
+            LOGINFO(f"Baseline {T_span:.4f} days too short for LS period")
+        return np.nan
+    Prot_max = min(Prot_max, 0.5 * T_span)
+
+    method, method_kwds = _ls_method(device)
     ls = LombScargle(time, flux)
     
     minimum_frequency = 1.0 / Prot_max
     maximum_frequency = 1.0 / Prot_min
     
-    frequency = np.linspace(minimum_frequency, maximum_frequency, N_freq)
-    power_ls = ls.power(frequency)
-    best_freq = frequency[np.argmax(power_ls)]
+    frequency, power_ls = ls.autopower(
+        minimum_frequency=minimum_frequency,
+        maximum_frequency=maximum_frequency,
+        samples_per_peak=samples_per_peak, method=method,
+        method_kwds=method_kwds
+    )
+    ix = np.argmax(power_ls)
+    lo = frequency[max(ix - 1, 0)]
+    hi = frequency[min(ix + 1, len(frequency) - 1)]
+
+    frequency = np.linspace(
+        max(lo, minimum_frequency), min(hi, maximum_frequency), N_freq
+    )
+    power_ls = ls.power(
+        frequency, method=method, assume_regular_frequency=True,
+        method_kwds=method_kwds
+    )
+    best_freq = _parabolic_peak(frequency, power_ls)
     LS_Prot = 1.0 / best_freq
     if verbose:
         LOGINFO(f"Measured LS period: {LS_Prot:.4f} days")
 
     return LS_Prot
 
+
+def _parabolic_peak(x, y):
+    """x at the maximum of y on the regular grid x, refined to sub-grid
+    accuracy by the vertex of the parabola through the peak and its two
+    neighbours."""
+    ix = int(np.argmax(y))
+    if ix == 0 or ix == len(y) - 1:
+        return x[ix]
+    y0, y1, y2 = y[ix - 1], y[ix], y[ix + 1]
+    curvature = y0 - 2 * y1 + y2
+    if not curvature < 0:
+        return x[ix]
+    return x[ix] + 0.5 * (y0 - y2) / curvature * (x[ix + 1] - x[ix])
+
+
+@njit(cache=True)
+def select_finite(time, flux):
+    """Return time and flux at the points where both are finite.  A single
+    pass that compacts into the output, in place of
+    `sel = np.isfinite(time) & np.isfinite(flux); time[sel], flux[sel]`."""
+
+    out_t = np.empty_like(time)
+    out_f = np.empty_like(flux)
+    k = 0
+    for i in range(time.size):
+        if np.isfinite(time[i]) and np.isfinite(flux[i]):
+            out_t[k] = time[i]
+            out_f[k] = flux[i]
+            k += 1
+    return out_t[:k], out_f[:k]
+
+
+def slide_clip_mad(time, flux, window_length, low=3, high=3, drop_clipped=False):
+    """
+    Sliding time-windowed outlier clipper: a compiled, output-identical
+    equivalent of `wotan.slide_clip(time, flux, window_length, low, high,
+    method='mad', center='median')`.
+
+    wotan clips each window with several numpy calls from a Python loop over
+    every point; here the same loop, with the same window bookkeeping and
+    overwrite order (and wotan's quirk of returning NaN fluxes as 0 unless
+    clipped), runs under numba.  time must be sorted.  If every flux is
+    finite, the window is instead kept sorted as it slides, so the median
+    is read off directly and the MAD found by bisection, and each point is
+    written once, by the last window that covers it.
+
+    By default returns the clipped flux (NaN where clipped).  With
+    drop_clipped=True, returns (time, flux) at the unclipped points only,
+    compacted in place inside the same compiled call.
+    """
+    time = np.ascontiguousarray(time, dtype=np.float64)
+    flux = np.ascontiguousarray(flux, dtype=np.float64)
+    if np.isfinite(flux).all():
+        # the usual case: the sorted-window kernel (same output, O(N w)
+        # memmove in place of O(N w) selection)
+        kernel = _slide_clip_mad_sorted
+    else:
+        kernel = _slide_clip_mad
+    clipped = kernel(time, flux, float(window_length), float(low), float(high))
+    if not drop_clipped:
+        return clipped
+    return _drop_nan(time.copy(), clipped)
+
+
+@njit(cache=True)
+def _drop_nan(time, flux):
+    """Compact time, flux in place to the points where flux is not NaN.
+    (Clipped fluxes are NaN; every other value is finite, since the clipper
+    maps NaN to 0 and +-inf to +-max float, and time is already finite.)"""
+    k = 0
+    for i in range(flux.shape[0]):
+        if not np.isnan(flux[i]):
+            time[k] = time[i]
+            flux[k] = flux[i]
+            k += 1
+    return time[:k], flux[:k]
+
+
+@njit(cache=True)
+def _slide_clip_mad(time, data, window_length, low, high):
+    size = time.shape[0]
+    clipped = np.full(size, np.nan)
+    if size == 0:
+        return clipped
+    low_index = np.min(time)
+    hi_index = np.max(time)
+    half_window = window_length / 2
+    buf = np.empty(size)
+    idx_start = 0
+    idx_end = 0
+    for i in range(size):
+        if time[i] > low_index and time[i] < hi_index:
+            while time[idx_start] < time[i] - half_window:
+                idx_start += 1
+            while idx_end < size and time[idx_end] < time[i] + half_window:
+                idx_end += 1
+            _clip_window(data, idx_start, idx_end, low, high, clipped, buf)
+    return clipped
+
+
+@njit(cache=True)
+def _clip_window(data, a, b, low, high, out, buf):
+    """wotan.slide_clipper.clipit (mad, median) on data[a:b], into out[a:b]."""
+    # window median, ignoring NaNs
+    k = 0
+    for j in range(a, b):
+        if not np.isnan(data[j]):
+            buf[k] = data[j]
+            k += 1
+    mid = np.median(buf[:k]) if k > 0 else np.nan
+
+    # NaN -> 0 and +-inf -> +-max float (np.nan_to_num), then the MAD
+    n = b - a
+    for j in range(n):
+        buf[j] = abs(_nan_to_num(data[a + j]) - mid)
+    cutoff = np.nan
+    if not np.isnan(mid):
+        cutoff = np.median(buf[:n])
+
+    for j in range(n):
+        x = _nan_to_num(data[a + j])
+        diff = x - mid
+        if diff > high * cutoff or diff < -low * cutoff:
+            out[a + j] = np.nan
+        else:
+            out[a + j] = x
+
+
+@njit(cache=True)
+def _nan_to_num(x):
+    if np.isnan(x):
+        return 0.0
+    if np.isinf(x):
+        return np.finfo(np.float64).max if x > 0 else -np.finfo(np.float64).max
+    return x
+
+
+@njit(cache=True)
+def _slide_clip_mad_sorted(time, data, window_length, low, high):
+    """_slide_clip_mad for all-finite data, with the same window bookkeeping,
+    keeping a sorted copy of the current window (insert and delete as the
+    window slides) instead of re-selecting medians from scratch."""
+    size = time.shape[0]
+    clipped = np.full(size, np.nan)
+    if size == 0:
+        return clipped
+    low_index = np.min(time)
+    hi_index = np.max(time)
+    half_window = window_length / 2
+    srt = np.empty(size)
+    n = 0 # the window data[a:b], sorted, is srt[:n]
+    a = 0
+    b = 0
+    # the previous window's bounds and centre/cutoff, written out once the
+    # next window's start (its first point no later window can overwrite)
+    # is known
+    prev_a = -1
+    prev_b = 0
+    prev_mid = 0.0
+    prev_cutoff = 0.0
+    for i in range(size):
+        if not (time[i] > low_index and time[i] < hi_index):
+            continue
+        new_a = a
+        while time[new_a] < time[i] - half_window:
+            new_a += 1
+        new_b = b
+        while new_b < size and time[new_b] < time[i] + half_window:
+            new_b += 1
+        for j in range(a, min(new_a, b)):
+            n = _sorted_remove(srt, n, data[j])
+        for j in range(max(b, new_a), new_b):
+            n = _sorted_insert(srt, n, data[j])
+        if new_a > b:
+            n = 0
+            for j in range(new_a, new_b):
+                n = _sorted_insert(srt, n, data[j])
+        a = new_a
+        b = new_b
+
+        if prev_a >= 0:
+            _clip_range(data, prev_a, min(a, prev_b), prev_mid, prev_cutoff,
+                        low, high, clipped)
+        half = n >> 1
+        if n & 1 == 0:
+            mid = (srt[half - 1] + srt[half]) / 2
+        else:
+            mid = srt[half]
+        p = np.searchsorted(srt[:n], mid)
+        if n & 1 == 0:
+            cutoff = (_kth_deviation(srt, n, p, mid, half - 1)
+                      + _kth_deviation(srt, n, p, mid, half)) / 2
+        else:
+            cutoff = _kth_deviation(srt, n, p, mid, half)
+        prev_a, prev_b, prev_mid, prev_cutoff = a, b, mid, cutoff
+
+    if prev_a >= 0:
+        _clip_range(data, prev_a, prev_b, prev_mid, prev_cutoff, low, high,
+                    clipped)
+    return clipped
+
+
+@njit(cache=True)
+def _clip_range(data, a, b, mid, cutoff, low, high, out):
+    for j in range(a, b):
+        diff = data[j] - mid
+        if diff > high * cutoff or diff < -low * cutoff:
+            out[j] = np.nan
+        else:
+            out[j] = data[j]
+
+
+@njit(cache=True)
+def _sorted_insert(srt, n, x):
+    k = np.searchsorted(srt[:n], x)
+    for j in range(n, k, -1):
+        srt[j] = srt[j - 1]
+    srt[k] = x
+    return n + 1
+
+
+@njit(cache=True)
+def _sorted_remove(srt, n, x):
+    k = np.searchsorted(srt[:n], x)
+    for j in range(k, n - 1):
+        srt[j] = srt[j + 1]
+    return n - 1
+
+
+@njit(cache=True)
+def _kth_deviation(srt, n, p, mid, k):
+    """k-th smallest (0-indexed) of |srt[:n] - mid|, given srt[:p] < mid <=
+    srt[p:n]: the deviations below p (mid - srt[p-1-i]) and from p on
+    (srt[p+i] - mid) are each ascending, so bisect on how many of the k+1
+    smallest come from below p."""
+    m = n - p
+    lo = max(0, k + 1 - m)
+    hi = min(k + 1, p)
+    while lo < hi:
+        i = (lo + hi) // 2
+        j = k + 1 - i
+        # take more from below p while its next deviation beats the last
+        # one taken from above
+        if j > 0 and (srt[p + j - 1] - mid) > (mid - srt[p - 1 - i]):
+            lo = i + 1
+        else:
+            hi = i
+    i = lo
+    j = k + 1 - i
+    kth = -np.inf
+    if i > 0:
+        kth = max(kth, mid - srt[p - i])
+    if j > 0:
+        kth = max(kth, srt[p + j - 1] - mid)
+    return kth
+
     
 def transit_mask(t, P, Tdur, t0):
     """Create a mask for transits given time, period, transit duration, and
     transit (midtime) epoch.  All should be passed in units of days."""
 
-    mask = np.abs(  (t - t0 + 0.5*P) % P - 0.5 * P )  < 0.5 * Tdur
+    t = np.asarray(t, dtype=np.float64)
+    mask = np.empty(t.shape, dtype=np.bool_)
+    _transit_mask_kernel(t.ravel(), float(P), float(Tdur), float(t0), mask.ravel())
     return mask
 
 
+def transit_masks(t, P, Tdur, t0):
+    """Transit masks for K trials at once: P, Tdur, t0 are length-K arrays
+    (or scalars, broadcast), and column k of the (len(t), K) result is
+    transit_mask(t, P[k], Tdur[k], t0[k]).  Use `.any(axis=1)` for the
+    union over trials.  One compiled pass over t for all trials, in float64
+    (the same expression and rounding as transit_mask)."""
+
+    t = np.ascontiguousarray(t, dtype=np.float64).ravel()
+    P, Tdur, t0 = (
+        np.ascontiguousarray(x, dtype=np.float64)
+        for x in np.broadcast_arrays(
+            np.atleast_1d(P), np.atleast_1d(Tdur), np.atleast_1d(t0)
+        )
+    )
+    masks = np.empty((t.shape[0], P.shape[0]), dtype=np.bool_)
+    _transit_masks_kernel(t, P, Tdur, t0, masks)
+    return masks
+
+
+@njit(cache=True)
+def _transit_masks_kernel(t, P, Tdur, t0, out):
+    half_P = 0.5 * P
+    half_Tdur = 0.5 * Tdur
+    for i in range(t.shape[0]):
+        for k in range(P.shape[0]):
+            out[i, k] = (
+                abs((t[i] - t0[k] + half_P[k]) % P[k] - half_P[k]) < half_Tdur[k]
+            )
+
+
+@njit(cache=True)
+def _transit_mask_kernel(t, P, Tdur, t0, out):
+    """out[i] = |(t[i] - t0 + P/2) % P - P/2| < Tdur/2, in one pass with no
+    temporaries (same expression and rounding as the numpy version)."""
+    half_P = 0.5 * P
+    half_Tdur = 0.5 * Tdur
+    for i in range(t.shape[0]):
+        out[i] = abs((t[i] - t0 + half_P) % P - half_P) < half_Tdur
+
+
 def time_bin_lightcurve(time, flux, binsize):
     """Bin the light curve in time with a fixed binsize.
     Returns arrays of binned time (bin centers) and mean flux in each bin."""
@@ -88,18 +467,31 @@ def time_bin_lightcurve(time, flux, binsize):
     # Digitize assigns each time to a bin index
     bin_idx = np.digitize(time, edges) - 1
 
-    binned_time = []
-    binned_flux = []
-    # Iterate over all bins
-    for i in range(len(edges) - 1):
-        mask = bin_idx == i
-        if not np.any(mask):
-            continue
-        # Compute mean time and flux in the bin
-        binned_time.append(np.nanmean(time[mask]))
-        binned_flux.append(np.nanmean(flux[mask]))
+    n_bins = len(edges) - 1
+
+    # Points outside [edges[0], edges[-1]) (including NaN times) are dropped
+    inbin = (bin_idx >= 0) & (bin_idx < n_bins)
+    bin_idx, time, flux = bin_idx[inbin], time[inbin], flux[inbin]
+
+    # Per-bin sums in one pass each; the flux mean ignores NaN fluxes
+    counts = np.bincount(bin_idx, minlength=n_bins)
+    tsum = np.bincount(bin_idx, weights=time, minlength=n_bins)
+    ok = np.isfinite(flux)
+    if ok.all():
+        # the usual case (preprocess_lightcurve bins only finite fluxes)
+        fcounts = counts
+        fsum = np.bincount(bin_idx, weights=flux, minlength=n_bins)
+    else:
+        fcounts = np.bincount(bin_idx[ok], minlength=n_bins)
+        fsum = np.bincount(bin_idx[ok], weights=flux[ok], minlength=n_bins)
+
+    # Keep non-empty bins; a bin whose fluxes are all NaN gets a NaN flux
+    nz = counts > 0
+    binned_time = tsum[nz] / counts[nz]
+    binned_flux = np.full(np.count_nonzero(nz), np.nan)
+    np.divide(fsum[nz], fcounts[nz], out=binned_flux, where=fcounts[nz] > 0)
 
-    return np.array(binned_time), np.array(binned_flux)
+    return binned_time, binned_flux
 
 
 def preprocess_lightcurve(datas, hdrs, mission, inject_dict=None):
@@ -127,9 +519,11 @@ def preprocess_lightcurve(datas, hdrs, mission, inject_dict=None):
             - 'epoch' (float, days)
     """
 
-    _time, _flux = [], []
-    sectors = []
-
+    # First pass: select good points in each light curve.  Their total is
+    # an upper bound on the output length (clipping and binning only drop
+    # points), so one pair of output buffers is allocated up front and each
+    # light curve is written at its offset, with no final concatenate.
+    selected = []
     for data, hdr in zip(datas, hdrs):
 
         time = data['TIME']
@@ -146,53 +540,63 @@ def preprocess_lightcurve(datas, hdrs, mission, inject_dict=None):
             flux = data['SAP_FLUX']
             qual = data['SAP_QUALITY']
         
-        sel = (qual == 0)
-        time = time[sel]
-        flux = flux[sel]
-
-        sel = np.isfinite(time) & np.isfinite(flux)
-        time = time[sel]
-        flux = flux[sel]
-
-        sel = (flux > 0)
-        time = time[sel]
-        flux = flux[sel]
-
-        time = time.astype(np.float64)
-        flux = flux.astype(np.float64)
-
-        flux /= np.nanmedian(flux)
+        # good quality, finite, and positive, in one gather (the FITS
+        # columns are big-endian, so this stays in numpy)
+        sel = (qual == 0) & np.isfinite(time) & np.isfinite(flux) & (flux > 0)
+        selected.append((time, flux, sel))
+
+    # Gather every sector's selected points into one native-f8 buffer (each
+    # boolean gather converts straight into its slice, with no per-sector
+    # astype copy); sectors are then processed as views of it.
+    counts = [np.count_nonzero(sel) for _, _, sel in selected]
+    bounds = np.cumsum([0] + counts)
+    time_all = np.empty(bounds[-1])
+    flux_all = np.empty(bounds[-1])
+    for (time, flux, sel), lo, hi in zip(selected, bounds[:-1], bounds[1:]):
+        time_all[lo:hi] = time[sel]
+        flux_all[lo:hi] = flux[sel]
+
+    # Each sector's output is no longer than its input, so it is written
+    # back into the same buffers at or before its own start, never over a
+    # sector not yet processed.
+    offset = 0
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+
+        time = time_all[lo:hi]
+        flux = flux_all[lo:hi]
+
+        # every point is finite here, so np.median (no NaN pass) suffices;
+        # the divide is in place on the sector's view of the buffer
+        flux /= np.median(flux)
 
         if isinstance(inject_dict, dict):
             from pbls.inject import inject_transit
             flux = inject_transit(time, flux, inject_dict)
-            flux /= np.nanmedian(flux)
+            flux /= np.median(flux)
 
         LS_Prot = get_LS_Prot(time, flux)
         cadence = np.nanmedian(np.diff(time))
-        window_length = np.maximum(LS_Prot/20, cadence * 10)
+        # (fmax: a NaN LS_Prot, from a too-short sector, falls back to cadence)
+        window_length = np.fmax(LS_Prot/20, cadence * 10)
 
-        clipped_flux = slide_clip(
-            time, flux, window_length=window_length,
-            low=100, high=2, method='mad', center='median'
+        time, flux = slide_clip_mad(
+            time, flux, window_length=window_length, low=100, high=2,
+            drop_clipped=True
         )
-
-        sel = np.isfinite(time) & np.isfinite(clipped_flux)
-        time = time[sel]
-        flux = 1.* clipped_flux[sel]
         assert len(time) == len(flux)
 
         # run TESS analysis at 30-minute binning after flare removal
         if mission == 'TESS':
             binsize = 30/24/60
-            btimes, bfluxs = time_bin_lightcurve( time, flux, binsize=binsize )
-            time, flux = 1.*btimes, 1.*bfluxs
+            time, flux = time_bin_lightcurve( time, flux, binsize=binsize )
 
-        _time.append(time)
-        _flux.append(flux)
+        n = len(time)
+        time_all[offset:offset+n] = time
+        flux_all[offset:offset+n] = flux
+        offset += n
 
-    time = np.concatenate(_time)
-    flux = np.concatenate(_flux)
+    time = time_all[:offset]
+    flux = flux_all[:offset]
 
     return time, flux
 
@@ -204,7 +608,7 @@ def mask_top_pbls_peak(star_id, iter_ix=0, snr_threshold=8.0, maxiter=3,
     Read in the periodogram.
     Take the highest-SNR peak's model, and mask in-transit points.
         (With Tdur multiplied by an `overmaskfactor` in case of underestimated Tdur.)
-    Make a CSV light curve with time, original flux, and masked flux.
+    Make a CSV light curve with time, original flux, and the in-transit mask.
     Return the highest-SNR peak value.
     """
 
@@ -237,7 +641,8 @@ def mask_top_pbls_peak(star_id, iter_ix=0, snr_threshold=8.0, maxiter=3,
         if hostname in ['wh1', 'wh2', 'wh3', 'marduk.local']:
             raise NotImplementedError
         else:
-            datas, hdrs = get_OSG_local_fits_lightcurve(base_star_id)
+            datas, hdrs = get_OSG_local_fits_lightcurve(
+                base_star_id, columns=LC_COLUMNS[mission])
             N_lcfiles = len(datas)
             LOGINFO(f"{star_id}: {N_lcfiles} light curves found.")
             time, flux = preprocess_lightcurve(datas, hdrs, mission, inject_dict=inject_dict)
@@ -261,17 +666,28 @@ def mask_top_pbls_peak(star_id, iter_ix=0, snr_threshold=8.0, maxiter=3,
     LOGINFO(f'Got P={P:.5f} d, Tdur={Tdur*24:.1f} hr, t0={t0:.4f}, SNR={max_snr:.1f}')
     LOGINFO(f'In-transit mask: {np.sum(in_transit)} points masked out of {len(time)}')
 
-    onearr = np.ones(len(time))
-    onearr[in_transit] = np.nan
-
-    time_masked = time * onearr
-    flux_masked = flux * onearr
-
-    out_df = pd.DataFrame({'time': time, 'flux_original': flux,
-                           'time_masked': time_masked, 'flux_masked': flux_masked})
-
+    # The masked light curve is time and flux with NaN where in_transit;
+    # get_OSG_local_csv_lightcurve applies the mask on read.
     out_csv = join(outprocessingdir, f'{star_id}_masked_lightcurve_iter{iter_ix}.csv')
-    out_df.to_csv(out_csv, index=False)
+    _write_csv(out_csv, {'time': time, 'flux_original': flux,
+                         'in_transit': in_transit.astype(np.uint8)})
     LOGINFO(f'Wrote masked light curve to {out_csv}')
 
-    return max_snr
\ No newline at end of file
+    return max_snr
+
+
+def _write_csv(csvpath, columns):
+    """Write a dict of equal-length numeric arrays to csvpath as a headed CSV
+    without an index.  Uses pyarrow's C++ writer if installed, else pandas.
+    pyarrow writes NaN as 'nan' where pandas leaves the field empty;
+    get_OSG_local_csv_lightcurve reads both.  The header is written here,
+    unquoted, since pyarrow would quote the column names."""
+    if pacsv is None:
+        pd.DataFrame(columns).to_csv(csvpath, index=False)
+        return
+    with open(csvpath, 'wb') as f:
+        f.write((','.join(columns) + '\n').encode())
+        pacsv.write_csv(
+            pa.table(columns), f,
+            write_options=pacsv.WriteOptions(include_header=False)
+        )
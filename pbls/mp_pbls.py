@@ -1,12 +1,32 @@
 import numpy as np
 import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 from .pbls import pbls_search
 
+# Per-worker copies of the search inputs, set once by _init_worker, so tasks
+# carry only a period rather than re-pickling time and flux for every task.
+_SHARED = {}
+
+
+def _init_worker(time, flux, durations_hr, poly_order):
+    _SHARED['time'] = time
+    _SHARED['flux'] = flux
+    _SHARED['durations_hr'] = durations_hr
+    _SHARED['poly_order'] = poly_order
+
 
 def _worker(args):
-    time, flux, trial_period, durations_hr, poly_order = args
-    # Run pbls_search for a single period
-    res = pbls_search(time, flux, np.array([trial_period]), durations_hr, poly_order, cache_coeffs=True)
+    ix, trial_period = args
+    return ix, _search_period(
+        _SHARED['time'], _SHARED['flux'], trial_period,
+        _SHARED['durations_hr'], _SHARED['poly_order']
+    )
+
+
+def _search_period(time, flux, trial_period, durations_hr, poly_order):
+    # Run pbls_search for a single period, on this worker's thread only
+    res = pbls_search(time, flux, np.array([trial_period]), durations_hr, poly_order,
+                      cache_coeffs=True, nworkers=1)
     # Extract period-level max SNR and corresponding best model params
     power0 = res['power'][0]
     coeffs = res['coeffs'][0]
@@ -18,19 +38,46 @@ def _worker(args):
     )
 
 
-def fast_pbls_search(time, flux, periods, durations_hr, poly_order=2, nworkers = mp.cpu_count()):
+def fast_pbls_search(time, flux, periods, durations_hr, poly_order=2, nworkers = mp.cpu_count(),
+                     backend='processes'):
     """
     Parallel accelerated variant of pbls_search using multiprocessing over periods.
+
+    time, flux, and the search settings reach each worker once (via the pool
+    initializer); tasks are just (index, period), and results are streamed
+    back as they finish, then put back in period order.
+
+    backend='threads' runs the periods in a thread pool instead: no fork and
+    no pickling, but it scales only as far as pbls_search's work runs in its
+    compiled (nogil) kernels rather than in the Python loop around them.
+    Either way each worker runs the serial kernel, so there are nworkers
+    threads in all.
     """
+    if backend not in ('processes', 'threads'):
+        raise ValueError(f"Unknown backend '{backend}'")
+
+    if backend == 'threads':
+        with ThreadPoolExecutor(max_workers=nworkers) as ex:
+            results = list(ex.map(
+                lambda p: _search_period(time, flux, p, durations_hr, poly_order),
+                periods
+            ))
+        return _collect(results, periods)
+
     maxworkertasks = 1000
-    pool = mp.Pool(nworkers, maxtasksperchild=maxworkertasks)
-    # Prepare tasks for each trial period
-    tasks = [(time, flux, p, durations_hr, poly_order) for p in periods]
-    # Execute tasks in parallel, preserving order
-    results = pool.map(_worker, tasks)
-    pool.close()
-    pool.join()
+    chunksize = max(1, len(periods) // (4 * nworkers))
+    results = [None] * len(periods)
+    with mp.Pool(nworkers, initializer=_init_worker,
+                 initargs=(time, flux, durations_hr, poly_order),
+                 maxtasksperchild=maxworkertasks) as pool:
+        for ix, res in pool.imap_unordered(_worker, enumerate(periods),
+                                           chunksize=chunksize):
+            results[ix] = res
+
+    return _collect(results, periods)
+
 
+def _collect(results, periods):
     # Unpack results
     power_list = [r[1] for r in results]
     snr_list = [r[2] for r in results]
@@ -54,4 +101,4 @@ def fast_pbls_search(time, flux, periods, durations_hr, poly_order=2, nworkers =
         'coeffs': coeffs_list,
         'periods': periods,
         'best_model': best_model
-    }
\ No newline at end of file
+    }
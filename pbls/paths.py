@@ -4,9 +4,16 @@ from os.path import join
 
 VERBOSE = 0
 
+def _ensure(paths):
+    # one makedirs per directory (no exists() stat first; parents included)
+    for p in paths:
+        if VERBOSE:
+            print(f"Making {p}")
+        os.makedirs(p, exist_ok=True)
+
 # cache for temporary files
 CACHEDIR = join(os.path.expanduser("~"), ".pbls_cache")
-if not os.path.exists(CACHEDIR): os.mkdir(CACHEDIR)
+_ensure([CACHEDIR])
 
 hostname = socket.gethostname()
 if hostname in ['wh1', 'wh2', 'wh3', 'marduk.local']:
@@ -15,8 +22,4 @@ if hostname in ['wh1', 'wh2', 'wh3', 'marduk.local']:
     TESTRESULTSDIR = join(RESULTSDIR, 'tests')
     TABLEDIR = join(RESULTSDIR, 'tables')
 
-    for l in [DATADIR, RESULTSDIR, TESTRESULTSDIR, TABLEDIR]:
-        if not os.path.exists(l):
-            if VERBOSE:
-                print(f"Making {l}")
-            os.mkdir(l)
\ No newline at end of file
+    _ensure([DATADIR, RESULTSDIR, TESTRESULTSDIR, TABLEDIR])
\ No newline at end of file
@@ -2,50 +2,479 @@ import numpy as np
 import numba
 import warnings
 
-def split_segments(idx):
+@numba.njit(cache=True, nogil=True)
+def split_segments(idx, out_bounds):
     """
-    Given sorted indices idx, split into lists of contiguous runs.
-    E.g. [2,3,4, 10,11] → [[2,3,4], [10,11]]
+    Given sorted indices idx, find its contiguous runs in one pass: run k is
+    idx[out_bounds[k, 0]:out_bounds[k, 1]].  Returns the number of runs;
+    out_bounds needs at least idx.size rows.
+    E.g. [2,3,4, 10,11] → [[0, 3], [3, 5]], 2
     """
-    if idx.size == 0:
-        return []
-    # find breakpoints
-    gaps = np.where(np.diff(idx) > 1)[0]
-    starts = np.concatenate(([0], gaps + 1))
-    ends   = np.concatenate((gaps, [idx.size - 1]))
-    return [idx[s:e+1] for s, e in zip(starts, ends)]
+    n = idx.shape[0]
+    if n == 0:
+        return 0
+    k = 0
+    s = 0
+    for i in range(1, n):
+        if idx[i] - idx[i - 1] > 1:
+            out_bounds[k, 0] = s
+            out_bounds[k, 1] = i
+            k += 1
+            s = i
+    out_bounds[k, 0] = s
+    out_bounds[k, 1] = n
+    return k + 1
 
 
-@numba.njit
+@numba.njit(cache=True, nogil=True)
 def detrend_segment(t_loc, f_loc, out_idx, poly_order):
-    N = t_loc.shape[0]
     M = poly_order + 1
-    Nout = out_idx.shape[0]
-    # build Vandermonde matrix on out-of-transit points
-    Vout = np.empty((Nout, M))
-    for i in range(Nout):
-        x = t_loc[out_idx[i]]
-        for j in range(M):
-            Vout[i, j] = x ** (poly_order - j)
-    # normal equations: (VᵀV) c = Vᵀ f
-    ATA = Vout.T @ Vout
-    # → add small diagonal ridge to avoid singular matrix
-    eps = 1e-8
-    for j in range(M):
-        ATA[j, j] += eps
-    ATb = Vout.T @ f_loc[out_idx]
-    coeffs = np.linalg.solve(ATA, ATb)
+    Q = np.empty((M, out_idx.shape[0]))
+    H = np.empty((M, poly_order))
+    d = np.empty(M)
+    C = np.empty((M, M))
+    coeffs = np.empty(M)
+    _fit_poly(t_loc, f_loc, out_idx, poly_order, Q, H, d)
+    _monomial_coeffs(H, d, poly_order, C, coeffs)
     # evaluate polynomial on all points
+    N = t_loc.shape[0]
     mval = np.empty(N)
     for i in range(N):
-        acc = 0.0
-        for j in range(M):
-            acc += coeffs[j] * (t_loc[i] ** (poly_order - j))
-        mval[i] = acc
+        mval[i] = _horner(coeffs, t_loc[i])
     return mval, f_loc - mval, coeffs
 
 
-def pbls_search(time, flux, periods, durations_hr, poly_order=2, cache_coeffs=False):
+# Relative size below which _fit_poly treats a new basis vector as zero.
+_ARNOLDI_RTOL = 1e-10
+
+
+@numba.njit(cache=True, nogil=True)
+def _fit_poly(t_loc, f_loc, out_idx, poly_order, Q, H, d):
+    """
+    Least-squares polynomial fit to (t_loc, f_loc)[out_idx] by Vandermonde
+    with Arnoldi (Brubeck, Nakatsukasa & Trefethen 2021): the basis
+    q_k = (t q_(k-1) - Σ_j H[j, k-1] q_j) / H[k, k-1] is orthogonalized
+    (modified Gram-Schmidt) on the fit points, so the coefficients d are
+    projections, with no ill-conditioned normal equations to regularize.
+    Q is (poly_order+1, >= len(out_idx)) scratch; H (poly_order+1,
+    poly_order) and d (poly_order+1) receive the recurrence and coefficients.
+    A degree the points cannot determine gets H[k, k-1] = 0 and d[k] = 0.
+    """
+    m = out_idx.shape[0]
+    M = poly_order + 1
+    for i in range(m):
+        Q[0, i] = 1.0
+    for k in range(1, M):
+        v_nrm = 0.0
+        for i in range(m):
+            Q[k, i] = t_loc[out_idx[i]] * Q[k - 1, i]
+            v_nrm += Q[k, i] * Q[k, i]
+        # columns are scaled to norm sqrt(m), like the constant one
+        for j in range(k):
+            h = 0.0
+            for i in range(m):
+                h += Q[j, i] * Q[k, i]
+            h /= m
+            H[j, k - 1] = h
+            for i in range(m):
+                Q[k, i] -= h * Q[j, i]
+        nrm = 0.0
+        for i in range(m):
+            nrm += Q[k, i] * Q[k, i]
+        if nrm <= _ARNOLDI_RTOL**2 * v_nrm:
+            # t q_(k-1) is (to roundoff) in the span of the previous basis
+            nrm = 0.0
+        nrm = np.sqrt(nrm / m)
+        H[k, k - 1] = nrm
+        for i in range(m):
+            Q[k, i] = Q[k, i] / nrm if nrm > 0 else 0.0
+    for k in range(M):
+        acc = 0.0
+        for i in range(m):
+            acc += Q[k, i] * f_loc[out_idx[i]]
+        d[k] = acc / m
+
+
+@numba.njit(cache=True, nogil=True)
+def _monomial_coeffs(H, d, poly_order, C, coeffs):
+    """Write the _fit_poly polynomial's coefficients in powers of t, highest
+    first (as np.polyfit), to coeffs; C is (poly_order+1)^2 scratch."""
+    M = poly_order + 1
+    # C[k, p]: coefficient of t**p in basis polynomial k
+    C[:, :] = 0.0
+    C[0, 0] = 1.0
+    for k in range(1, M):
+        if not H[k, k - 1] > 0:
+            continue
+        for p in range(1, M):
+            C[k, p] = C[k - 1, p - 1]
+        for j in range(k):
+            for p in range(M):
+                C[k, p] -= H[j, k - 1] * C[j, p]
+        for p in range(M):
+            C[k, p] /= H[k, k - 1]
+    coeffs[:] = 0.0
+    for k in range(M):
+        for p in range(M):
+            coeffs[poly_order - p] += d[k] * C[k, p]
+
+
+@numba.njit(cache=True, nogil=True)
+def _horner(coeffs, t):
+    """Polynomial with coefficients highest first, at t."""
+    acc = coeffs[0]
+    for j in range(1, coeffs.shape[0]):
+        acc = acc * t + coeffs[j]
+    return acc
+
+
+@numba.njit(cache=True, nogil=True, error_model='numpy')
+def depth_snr(f_in, f_out):
+    """
+    Transit depth mean(f_out) - mean(f_in) and its SNR,
+    depth / sqrt(var(f_in)/n_in + var(f_out)/n_out), from the sums and sums
+    of squares of each array in one compiled pass (see _depth_snr_sums).
+    NaN if there are no in-transit points.
+    """
+    s_in = 0.0
+    ss_in = 0.0
+    for x in f_in:
+        s_in += x
+        ss_in += x * x
+    s_out = 0.0
+    ss_out = 0.0
+    for x in f_out:
+        s_out += x
+        ss_out += x * x
+    return _depth_snr_sums(f_in.shape[0], s_in, ss_in,
+                           f_out.shape[0], s_out, ss_out)
+
+
+@numba.njit(cache=True, nogil=True, error_model='numpy')
+def _depth_snr_sums(n_in, s_in, ss_in, n_out, s_out, ss_out):
+    """
+    depth_snr from the counts, sums and sums of squares of the in- and
+    out-of-transit fluxes, so they can be accumulated without storing the
+    fluxes.  var = ss/n - mean**2 is accurate here: the fluxes are
+    residuals of the local detrending, with means near zero.
+    """
+    if n_in == 0 or n_out == 0:
+        return np.nan, np.nan
+    mean_in = s_in / n_in
+    mean_out = s_out / n_out
+    var_in = max(ss_in / n_in - mean_in * mean_in, 0.0)
+    var_out = max(ss_out / n_out - mean_out * mean_out, 0.0)
+    depth = mean_out - mean_in
+    snr = depth / np.sqrt(var_in / n_in + var_out / n_out)
+    return depth, snr
+
+
+# Margin (in phase) by which _local_window widens its time lookups, so that
+# rounding in the phase computation cannot drop a point from the candidates.
+_WINDOW_PAD = 1e-9
+
+
+@numba.njit(cache=True, nogil=True)
+def _window_points(phase, center_phase, win, a, b, rel_phase, local_idx,
+                   n_local):
+    """Append the points of [a, b) within win of center_phase (in wrapped
+    phase) to local_idx[n_local:], and return the new count."""
+    for i in range(a, b):
+        r = phase[i] - center_phase
+        r -= np.round(r)
+        if np.abs(r) <= win:
+            rel_phase[i] = r
+            local_idx[n_local] = i
+            n_local += 1
+    return n_local
+
+
+@numba.njit(cache=True, nogil=True)
+def _local_window(time, tmin, trial_period, phase, center_phase, win,
+                  rel_phase, local_idx):
+    """
+    Indices i (ascending) with |rel_phase[i]| <= win, where rel_phase is
+    phase - center_phase wrapped to [-0.5, 0.5]; writes them to local_idx
+    and their rel_phase, and returns their count.
+
+    time is sorted, so each transit's window is a contiguous run of it:
+    only the points found by binary search in each cycle's window
+    (± _WINDOW_PAD) are tested, with the same arithmetic as a full scan,
+    so the result is identical.
+    """
+    N = time.shape[0]
+    if 2.0 * (win + _WINDOW_PAD) >= 1.0:
+        # the window spans the whole cycle: test every point
+        return _window_points(phase, center_phase, win, 0, N,
+                              rel_phase, local_idx, 0)
+
+    # phase is in [0, 1) and center_phase in [0, ~1.2), so the transit
+    # windows are those of cycles -1 through (baseline / period) + 1
+    n_local = 0
+    b = 0
+    for n in range(-1, int((time[N - 1] - tmin) / trial_period) + 2):
+        lo = tmin + (n + center_phase - win - _WINDOW_PAD) * trial_period
+        hi = tmin + (n + center_phase + win + _WINDOW_PAD) * trial_period
+        a = b + np.searchsorted(time[b:], lo)
+        b = a + np.searchsorted(time[a:], hi, side='right')
+        n_local = _window_points(phase, center_phase, win, a, b,
+                                 rel_phase, local_idx, n_local)
+    return n_local
+
+
+@numba.njit(cache=True, nogil=True, error_model='numpy')
+def _pbls_period(time, flux, tmin, trial_period, durations_hr, durations_days,
+                 poly_order, cadence, baseline_time):
+    """
+    One period of the trial loop: its max SNR, and the duration index and
+    epoch of the first trial reaching it.
+    """
+    N = time.shape[0]
+    best_dur_ix = -1
+    best_epoch = 0.0
+    phase = np.empty(N)
+    for i in range(N):
+        phase[i] = ((time[i] - tmin) % trial_period) / trial_period
+    rel_phase = np.empty(N)
+    local_idx = np.empty(N, dtype=np.int64)
+    seg_bounds = np.empty((N, 2), dtype=np.int64)
+    out_local = np.empty(N, dtype=np.int64)
+    t_rel = np.empty(N)
+    Q = np.empty((poly_order + 1, N))
+    H = np.empty((poly_order + 1, poly_order))
+    d = np.empty(poly_order + 1)
+    C = np.empty((poly_order + 1, poly_order + 1))
+    coeffs = np.empty(poly_order + 1)
+    period_max_snr = -np.inf
+
+    for idur in range(durations_hr.shape[0]):
+        trial_duration = durations_days[idur] / trial_period
+        dphase = trial_duration / 3
+        # the epochs of np.arange(0, 1 + dphase, dphase), k * dphase,
+        # without allocating them
+        n_epochs = int(np.ceil((1 + dphase) / dphase))
+        half_pd = trial_duration * 0.5
+        win = 3.0 * trial_duration
+
+        for iepoch in range(n_epochs):
+            epoch = iepoch * dphase
+            # relative phase to the nearest transit center; ±win window
+            center_phase = epoch + half_pd
+            n_local = _local_window(
+                time, tmin, trial_period, phase, center_phase, win,
+                rel_phase, local_idx
+            )
+            if n_local < (poly_order + 1):
+                continue
+
+            # contiguous runs of local_idx are the transits; detrend
+            # those with enough out-of-transit points
+            n_in = 0
+            s_in = 0.0
+            ss_in = 0.0
+            n_out = 0
+            s_out = 0.0
+            ss_out = 0.0
+            n_segs = split_segments(local_idx[:n_local], seg_bounds)
+            for iseg in range(n_segs):
+                a = local_idx[seg_bounds[iseg, 0]]
+                b = local_idx[seg_bounds[iseg, 1] - 1] + 1
+
+                # out-of-transit positions in the segment; time is
+                # sorted and (being in a window) finite, so the middle
+                # of them gives np.nanmedian of their times
+                n_seg_out = 0
+                for i in range(a, b):
+                    if not np.abs(rel_phase[i]) <= half_pd:
+                        out_local[n_seg_out] = i - a
+                        n_seg_out += 1
+                if n_seg_out < (poly_order + 1):
+                    continue
+                half = n_seg_out >> 1
+                if n_seg_out & 1 == 0:
+                    _t0 = (time[a + out_local[half - 1]]
+                           + time[a + out_local[half]]) / 2
+                else:
+                    _t0 = time[a + out_local[half]]
+
+                # detrend as detrend_segment would on time[a:b] - _t0,
+                # accumulating the in/out sums instead of the arrays
+                for i in range(a, b):
+                    t_rel[i - a] = time[i] - _t0
+                _fit_poly(t_rel, flux[a:b], out_local[:n_seg_out],
+                          poly_order, Q, H, d)
+                _monomial_coeffs(H, d, poly_order, C, coeffs)
+                for i in range(a, b):
+                    fcor = flux[i] - _horner(coeffs, t_rel[i - a])
+                    if np.abs(rel_phase[i]) <= half_pd:
+                        n_in += 1
+                        s_in += fcor
+                        ss_in += fcor * fcor
+                    else:
+                        n_out += 1
+                        s_out += fcor
+                        ss_out += fcor * fcor
+
+            if n_out == 0:
+                continue
+
+            depth, snr = _depth_snr_sums(n_in, s_in, ss_in,
+                                         n_out, s_out, ss_out)
+
+            # coverage requirement (see _trial_model)
+            trial_duration_days = trial_duration * trial_period
+            expect_n_transits = baseline_time / trial_period
+            expected_n_in = expect_n_transits * (trial_duration_days / cadence)
+            if n_in < 0.1 * expected_n_in:
+                continue
+
+            if snr > period_max_snr:
+                period_max_snr = snr
+                best_dur_ix = idur
+                best_epoch = epoch
+
+
+    return period_max_snr, best_dur_ix, best_epoch
+
+
+@numba.njit(cache=True, parallel=True, nogil=True, error_model='numpy')
+def _pbls_kernel(time, flux, tmin, periods, durations_hr, poly_order,
+                 cadence, baseline_time):
+    """
+    The pbls_search trial loop, compiled: for each period (in parallel over
+    numba's threads), the max SNR over its (duration, epoch) trials, and the duration index and
+    epoch of the first trial reaching it (-1 and 0 if no trial qualified).
+    time must be sorted.  Each trial is evaluated exactly as in
+    _trial_model, in the same order, so results match it bit for bit.
+    """
+    n_periods = periods.shape[0]
+    power = np.full(n_periods, -np.inf)
+    best_dur_ix = np.full(n_periods, -1, dtype=np.int64)
+    best_epoch = np.zeros(n_periods)
+    durations_days = durations_hr / 24.
+
+    for ip in numba.prange(n_periods):
+        power[ip], best_dur_ix[ip], best_epoch[ip] = _pbls_period(
+            time, flux, tmin, periods[ip], durations_hr, durations_days,
+            poly_order, cadence, baseline_time
+        )
+
+    return power, best_dur_ix, best_epoch
+
+
+@numba.njit(cache=True, nogil=True, error_model='numpy')
+def _pbls_kernel_serial(time, flux, tmin, periods, durations_hr, poly_order,
+                        cadence, baseline_time):
+    """
+    _pbls_kernel on the calling thread only.  It never enters numba's
+    thread pool, so it is safe to call from several Python threads at once
+    and uses one core in single-core (pool worker or batch) jobs.
+    """
+    n_periods = periods.shape[0]
+    power = np.full(n_periods, -np.inf)
+    best_dur_ix = np.full(n_periods, -1, dtype=np.int64)
+    best_epoch = np.zeros(n_periods)
+    durations_days = durations_hr / 24.
+
+    for ip in range(n_periods):
+        power[ip], best_dur_ix[ip], best_epoch[ip] = _pbls_period(
+            time, flux, tmin, periods[ip], durations_hr, durations_days,
+            poly_order, cadence, baseline_time
+        )
+
+    return power, best_dur_ix, best_epoch
+
+
+def _trial_model(time, flux, tmin, trial_period, trial_duration, epoch,
+                 poly_order):
+    """
+    Evaluate one (period, duration, epoch) trial on sorted time, flux: the
+    detrended in/out-of-transit fluxes, depth and SNR, and the concatenated
+    local arrays and polynomial coefficients of its good transits.  None if
+    no transit window has enough out-of-transit points for a fit.
+    """
+    phase = ((time - tmin) % trial_period) / trial_period
+    half_pd = trial_duration * 0.5
+
+    # #2-#4: create a mask of all in transit points, which when
+    # iterated over, yields each transit.
+
+    # 2) compute relative phase to nearest transit center
+    center_phase = epoch + half_pd
+    rel_phase    = phase - center_phase
+    rel_phase   -= np.round(rel_phase)     # now in [-0.5, +0.5]
+
+    # 3) single local_mask for ±3 Tdur
+    win = 3.0 * trial_duration
+    local_mask = np.abs(rel_phase) <= win
+    local_idx_all = np.nonzero(local_mask)[0]
+    if local_idx_all.size < (poly_order + 1):
+        return None
+
+    # 4) split into contiguous transits
+    seg_bounds = np.empty((local_idx_all.size, 2), dtype=np.int64)
+    n_segs = split_segments(local_idx_all, seg_bounds)
+    good_transits = []
+    for start, end in seg_bounds[:n_segs]:
+        seg = local_idx_all[start:end]
+        # in-transit in this segment
+        in_mask = np.abs(rel_phase[seg]) <= half_pd
+        out_mask = ~in_mask
+        if out_mask.sum() < (poly_order + 1):
+            continue
+        # store segment idx + local in- and out-of-transit positions
+        good_transits.append(
+            (seg, np.flatnonzero(in_mask), np.flatnonzero(out_mask))
+        )
+
+    if not good_transits:
+        return None
+
+    # “second pass”: iterate over each segment (each transit)
+    all_in_flux = []; all_out_flux = []
+    local_times = []; local_fluxes = []
+    models      = []; residuals = []
+    poly_coeffs = []
+
+    for (local_idx, in_local, out_local) in good_transits:
+        t_loc = time[local_idx]
+        f_loc = flux[local_idx]
+
+        # fit poly to out-of-transit points (compiled normal
+        # equations); _t0 subtraction improves numerical stability.
+        _t0 = np.nanmedian(t_loc[out_local])
+        mval, fcor, poly = detrend_segment(t_loc - _t0, f_loc, out_local, poly_order)
+
+        poly_coeffs.append(poly)
+        local_times.append(t_loc)
+        local_fluxes.append(f_loc)
+        models.append(mval)
+        residuals.append(fcor)
+
+        all_in_flux.append (fcor[in_local])
+        all_out_flux.append(fcor[out_local])
+
+    # Concatenate data from all good transits for this trial, and compute the
+    # transit depth and SNR on the detrended (residual) data
+    all_in_transit_flux = np.concatenate(all_in_flux)
+    all_out_transit_flux = np.concatenate(all_out_flux)
+    depth, snr = depth_snr(all_in_transit_flux, all_out_transit_flux)
+
+    return {
+        'depth': depth,
+        'snr': snr,
+        'time': np.concatenate(local_times),
+        'flux': np.concatenate(local_fluxes),
+        'model_flux': np.concatenate(models),
+        'flux_resid': np.concatenate(residuals),
+        'all_in_transit_flux': all_in_transit_flux,
+        'all_out_transit_flux': all_out_transit_flux,
+        'coeffs': np.vstack(poly_coeffs),
+    }
+
+
+def pbls_search(time, flux, periods, durations_hr, poly_order=2, cache_coeffs=False,
+                nworkers=1):
     """
     A Box Least Squares (BLS) variant that fits and subtracts a local polynomial trend
     in the time domain around each transit event to mitigate stellar spot-induced variability.
@@ -80,6 +509,11 @@ def pbls_search(time, flux, periods, durations_hr, poly_order=2, cache_coeffs=Fa
         Order of the local polynomial to be fit in time (e.g., 2 for quadratic).
     cache_coeffs : bool, optional
         If True, cache the polynomial coefficients for each trial period.
+    nworkers : int or None, optional
+        Number of threads the trial periods are spread over.  The default, 1,
+        runs on the calling thread only, as single-core batch jobs and the
+        workers of mp_pbls.fast_pbls_search need.  None uses numba's thread
+        count (all cores, unless NUMBA_NUM_THREADS is set).
     
     Returns
     -------
@@ -97,24 +531,6 @@ def pbls_search(time, flux, periods, durations_hr, poly_order=2, cache_coeffs=Fa
                'all_out_transit_flux': out-of-transit flux after detrending.
     """
 
-    best_snr = -np.inf
-    best_period = None
-    best_duration_hr = None
-    best_epoch = None
-    best_epoch_days = None
-    best_depth = None
-    
-    # These will store the best model's concatenated arrays
-    best_local_time = None
-    best_local_flux = None
-    best_model_flux = None
-    best_flux_resid = None
-    best_all_in_transit_flux = None
-    best_all_out_transit_flux = None
-    
-    power_list = []
-    coeff_list = []
-    
     tmin = np.min(time)
     tmax = np.max(time)
     cadence = np.median(np.diff(np.sort(time)))
@@ -122,147 +538,62 @@ def pbls_search(time, flux, periods, durations_hr, poly_order=2, cache_coeffs=Fa
     
     # Ensure time and flux are sorted in time
     sort_idx = np.argsort(time)
-    time = time[sort_idx]
-    flux = flux[sort_idx]
-    
-    # Loop over trial periods
-    for trial_period in periods:
-
-        period_max_snr = -np.inf
-        coeffs_max_snr = None
-        phase = ((time - tmin) % trial_period) / trial_period # pre-fold once per period
-
-        durations = (durations_hr / 24.) / trial_period
-        
-        # Loop over trial durations (units: fraction of period)
-        for trial_duration in durations:
-           
-            # Define possible start phases (epochs) from 0 to (1 - duration)
-            _oversample = 3
-            dphase = trial_duration / _oversample
-            epochs = np.arange(0, 1 + dphase, dphase)
-
-            half_pd = trial_duration * 0.5
-
-            for epoch in epochs:
-
-                # #2-#4: create a mask of all in transit points, which when
-                # iterated over, yields each transit.
-                
-                # 2) compute relative phase to nearest transit center
-                center_phase = epoch + half_pd
-                rel_phase    = phase - center_phase
-                rel_phase   -= np.round(rel_phase)     # now in [-0.5, +0.5]
-
-                # 3) single local_mask for ±3 Tdur
-                win = 3.0 * trial_duration
-                local_mask = np.abs(rel_phase) <= win
-                local_idx_all = np.nonzero(local_mask)[0]
-                if local_idx_all.size < (poly_order + 1):
-                    continue
+    time = np.ascontiguousarray(time[sort_idx], dtype=np.float64)
+    flux = np.ascontiguousarray(flux[sort_idx], dtype=np.float64)
+    periods = np.asarray(periods, dtype=np.float64)
+    durations_hr = np.asarray(durations_hr, dtype=np.float64)
 
-                # 4) split into contiguous transits
-                segs = split_segments(local_idx_all)
-                good_transits = []
-                for seg in segs:
-                    # in-transit in this segment
-                    in_mask = np.abs(rel_phase[seg]) <= half_pd
-                    out_mask = ~in_mask
-                    if out_mask.sum() < (poly_order + 1):
-                        continue
-                    # store segment idx + local in-transit positions
-                    good_transits.append((seg, np.nonzero(in_mask)[0]))
-
-                if not good_transits:
-                    continue
+    # Every (period, duration, epoch) trial, compiled (and, if nworkers is
+    # not 1, parallel over periods): the max SNR per period and the trial
+    # that reached it.
+    #
+    # When NaN-masking occurs, encounter an odd behavior in which
+    # single-point outliers skew the entire SNR distribution.
+    # So the kernel requires that at least 10% of the expected in-transit
+    # points are actually present.  (This fraction is low enough to
+    # allow e.g. missed quarters or other normal gaps.)
+    kernel_args = (
+        time, flux, float(tmin), periods, durations_hr, int(poly_order),
+        float(cadence), float(baseline_time)
+    )
+    if nworkers == 1:
+        power, best_dur_ix, best_epoch = _pbls_kernel_serial(*kernel_args)
+    else:
+        prev_nthreads = numba.get_num_threads()
+        if nworkers is not None:
+            numba.set_num_threads(max(1, min(int(nworkers), numba.config.NUMBA_NUM_THREADS)))
+        try:
+            power, best_dur_ix, best_epoch = _pbls_kernel(*kernel_args)
+        finally:
+            numba.set_num_threads(prev_nthreads)
 
-                # “second pass”: iterate over each segment (each transit)
-                all_in_flux = []; all_out_flux = []
-                local_times = []; local_fluxes = []
-                models      = []; residuals = []                
-                poly_coeffs = []
-
-                for (local_idx, in_local) in good_transits:
-                    t_loc = time[local_idx]
-                    f_loc = flux[local_idx]
-                    out_local = np.setdiff1d(np.arange(len(local_idx)), in_local)
-
-                    # fit poly to out-of-transit using either numba or polyfit.
-                    # _t0 subtraction improves numerical stability.
-                    USE_NUMBA = True
-                    if USE_NUMBA:
-                        _t0 = np.nanmedian(t_loc[out_local])
-                        mval, fcor, poly = detrend_segment(t_loc - _t0, f_loc, out_local, poly_order)
-                    else:
-                        _t0  = np.nanmedian(t_loc[out_local])
-                        p    = np.polyfit(t_loc[out_local] - _t0, f_loc[out_local], poly_order)
-                        poly = np.poly1d(p)
-                        mval = poly(t_loc - _t0)
-                        fcor = f_loc - mval
-
-                    poly_coeffs.append(poly)
-                    local_times.append(t_loc)
-                    local_fluxes.append(f_loc)
-                    models.append(mval)
-                    residuals.append(fcor)
-
-                    all_in_flux.append (fcor[in_local])
-                    all_out_flux.append(fcor[out_local])                
-
-                # Concatenate data from all good transits for this (trial_period, trial_duration, epoch) trial
-                all_in_transit_flux = np.concatenate(all_in_flux)
-                all_out_transit_flux = np.concatenate(all_out_flux)
-                local_time_concat = np.concatenate(local_times)
-                local_flux_concat = np.concatenate(local_fluxes)
-                model_flux_concat = np.concatenate(models)
-                flux_resid_concat = np.concatenate(residuals)
-                poly_coeffs_concat = np.vstack(poly_coeffs)
-                
-                # Compute the transit depth and SNR on the detrended (residual) data
-                depth = np.mean(all_out_transit_flux) - np.mean(all_in_transit_flux)
-                n_in = len(all_in_transit_flux)
-                n_out = len(all_out_transit_flux)
-                var_in = np.var(all_in_transit_flux)
-                var_out = np.var(all_out_transit_flux)
-
-                # When NaN-masking occurs, encounter an odd behavior in which
-                # single-point outliers skew the entire SNR distribution.
-                # Here, we require that at least 10% of the expected in-transit
-                # points are actually present.  (This fraction is low enough to
-                # allow e.g. missed quarters or other normal gaps.)
-                trial_duration_days = trial_duration * trial_period
-                expect_n_transits = baseline_time / trial_period
-                expected_n_in = expect_n_transits * (trial_duration_days / cadence)
-                minimum_covering_fraction = 0.1
-                if n_in < minimum_covering_fraction * expected_n_in:
-                    continue
+    # The global best is the first trial, in search order, with the highest
+    # SNR: that of the first period reaching the max power.  Only its model
+    # arrays are kept, so only it is re-evaluated for them.
+    ib = int(np.argmax(power))
+    if best_dur_ix[ib] < 0:
+        raise ValueError("pbls_search: no trial had enough points to fit")
+
+    def _period_best_model(ip):
+        trial_duration = (durations_hr[best_dur_ix[ip]] / 24.) / periods[ip]
+        return _trial_model(time, flux, tmin, periods[ip], trial_duration,
+                            best_epoch[ip], poly_order)
+
+    best_period = periods[ib]
+    best_duration = (durations_hr[best_dur_ix[ib]] / 24.) / best_period # phase units
+    best_model = _period_best_model(ib)
+    best_snr = best_model['snr']
+    best_depth = best_model['depth']
+    best_duration_hr = best_duration * best_period * 24.0  # convert to hours
+    best_phase = best_epoch[ib] # phase units, technically *ingress*
+    best_epoch_days = best_phase * best_period + tmin # time units
+
+    if cache_coeffs:
+        coeff_list = [
+            _period_best_model(ip)['coeffs'] if best_dur_ix[ip] >= 0 else None
+            for ip in range(len(periods))
+        ]
 
-                snr = depth / np.sqrt(var_in / n_in + var_out / n_out)
-                
-                # Update period-level max SNR
-                if snr > period_max_snr:
-                    period_max_snr = snr
-                    coeffs_max_snr = poly_coeffs_concat
-                
-                # Update global best parameters and best-model arrays if this trial is best so far
-                if snr > best_snr:
-                    best_snr = snr
-                    best_period = trial_period
-                    best_duration_hr = trial_duration * trial_period * 24.0  # convert to hours
-                    best_epoch = epoch # phase units, technically *ingress*
-                    best_epoch_days = epoch * trial_period + tmin # time units
-                    best_depth = depth
-                    
-                    best_local_time = local_time_concat
-                    best_local_flux = local_flux_concat
-                    best_model_flux = model_flux_concat
-                    best_flux_resid = flux_resid_concat
-                    best_all_in_transit_flux = all_in_transit_flux
-                    best_all_out_transit_flux = all_out_transit_flux
-
-        power_list.append(period_max_snr)
-        coeff_list.append(coeffs_max_snr)
-    
     # Construct output dictionary with nested dictionaries
     # Since the routine above is technically keeping track of "epoch" as the
     # ingress time, correct this in the output to the usual convention of
@@ -271,20 +602,20 @@ def pbls_search(time, flux, periods, durations_hr, poly_order=2, cache_coeffs=Fa
         'best_params': {
             'period': float(best_period),
             'duration_hr': float(best_duration_hr),
-            'epoch': float(best_epoch + 0.5 * (best_duration_hr / 24)/best_period),
+            'epoch': float(best_phase + 0.5 * (best_duration_hr / 24)/best_period),
             'epoch_days': float(best_epoch_days + 0.5 * best_duration_hr / 24),
             'depth': float(best_depth),
             'snr': float(best_snr)
         },
-        'power': np.array(power_list).tolist(),
+        'power': power.tolist(),
         'periods': periods.tolist(),
         'best_model': {
-            'time': best_local_time.tolist(),
-            'flux': best_local_flux.tolist(),
-            'model_flux': best_model_flux.tolist(),
-            'flux_resid': best_flux_resid.tolist(),
-            'all_in_transit_flux': best_all_in_transit_flux.tolist(),
-            'all_out_transit_flux': best_all_out_transit_flux.tolist(),
+            'time': best_model['time'].tolist(),
+            'flux': best_model['flux'].tolist(),
+            'model_flux': best_model['model_flux'].tolist(),
+            'flux_resid': best_model['flux_resid'].tolist(),
+            'all_in_transit_flux': best_model['all_in_transit_flux'].tolist(),
+            'all_out_transit_flux': best_model['all_out_transit_flux'].tolist(),
         }
     }
 
@@ -36,7 +36,7 @@ from pbls.paths import CACHEDIR
 from pbls.getters import (
     get_OSG_local_fits_lightcurve, get_OSG_local_csv_lightcurve, parse_star_id
 )
-from pbls.lc_processing import preprocess_lightcurve
+from pbls.lc_processing import preprocess_lightcurve, select_finite, LC_COLUMNS
 from pbls.period_grids import generate_uniformfreq_period_grid
 from pbls.pbls import pbls_search
 from pbls.mp_pbls import fast_pbls_search
@@ -89,9 +89,11 @@ def run_pbls_chunk(star_id, period_grid_chunk_ix, N_total_chunks, iter_ix=0):
             os.makedirs(cache_dir, exist_ok=True)
             datas, hdrs = fast_get_mast_lightcurve(
                 base_star_id, mission=mission, cadence=cadence,
-                author=author, cache_dir=cache_dir)
+                author=author, cache_dir=cache_dir,
+                columns=LC_COLUMNS[mission])
         else:
-            datas, hdrs = get_OSG_local_fits_lightcurve(base_star_id)
+            datas, hdrs = get_OSG_local_fits_lightcurve(
+                base_star_id, columns=LC_COLUMNS[mission])
 
         N_lcfiles = len(datas)
         LOGINFO(f"{star_id}: {N_lcfiles} light curves found.")
@@ -100,8 +102,7 @@ def run_pbls_chunk(star_id, period_grid_chunk_ix, N_total_chunks, iter_ix=0):
     else:
         # Load the masked light curve made by mask.sub last iteration.
         time, flux = get_OSG_local_csv_lightcurve(star_id, iter_ix=iter_ix-1)
-        sel = np.isfinite(time) & np.isfinite(flux)
-        time, flux = time[sel], flux[sel]
+        time, flux = select_finite(time, flux)
         LOGINFO(f"{star_id}: {len(time)} finite points found (iter_ix={iter_ix}).")
 
     # Generate period grid and chunk it.
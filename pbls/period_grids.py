@@ -89,8 +89,9 @@ def generate_Ofir2014_period_grid(
     period_max = min(time_span / 2.0, clamp_period_max)
 
     # NOTE: different from what Ofir advocates, which is a Roche-limit cutoff.
-    f_min = 1.0 / period_max
-    f_max = 1.0 / period_min
+    # (Frequencies in Hz, to match A below.)
+    f_min = 1.0 / (period_max * SECONDS_PER_DAY)
+    f_max = 1.0 / (period_min * SECONDS_PER_DAY)
 
     A = ((2 * pi) ** (2.0 / 3) / pi) * R / (G * M) ** (1.0 / 3) / (T * oversampling_factor)
     C = f_min ** (1.0 / 3) - A / 3.0
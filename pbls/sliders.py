@@ -1,4 +1,5 @@
 import numpy as np
+from numba import njit
 
 def variablewindow_flatten(
     x: np.ndarray,
@@ -12,32 +13,133 @@ def variablewindow_flatten(
 ):
     """
     Like wotan.flatten but allows window_length to be an array of per-point widths.
+
+    The window of point i is every point with |x - x[i]| <= window_length[i]/2.
+    In x order these are a contiguous run, so the trend is computed in one
+    compiled sweep that moves the run's ends and keeps its y values sorted,
+    rather than masking all N points for each i.
     """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
     N = len(x)
     # build per-point window widths
     if np.isscalar(window_length):
-        wld = np.full(N, window_length)
+        wld = np.full(N, window_length, dtype=np.float64)
     else:
-        wld = np.asarray(window_length)
+        wld = np.asarray(window_length, dtype=np.float64)
         if wld.shape != x.shape:
             raise ValueError("window_length must be scalar or same shape as x")
-    trend = np.zeros(N)
-    for i in range(N):
-        half = wld[i] / 2
-        mask = np.abs(x - x[i]) <= half
-        vals = y[mask]
-        if method == 'trim_mean':
-            n = len(vals)
-            k = int(np.floor(proportiontocut * n))
-            if 2*k >= n:
-                # too much trimming → simple mean
-                trend[i] = np.nanmean(vals)
-            else:
-                s = np.sort(vals)
-                trend[i] = np.mean(s[k:n-k])
-        else:
-            raise NotImplementedError(f"method {method} not implemented")
+    if method != 'trim_mean':
+        raise NotImplementedError(f"method {method} not implemented")
+
+    if N > 1 and np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind='stable')
+        trend = np.empty(N)
+        trend[order] = _sliding_trim_mean(
+            x[order], y[order], wld[order], proportiontocut
+        )
+    else:
+        trend = _sliding_trim_mean(x, y, wld, proportiontocut)
+
     flat = y - trend
     if return_trend:
         return flat, trend
     return flat
+
+
+@njit(cache=True)
+def _sliding_trim_mean(x, y, wld, proportiontocut):
+    """
+    For sorted x, the trimmed mean of y over each point's window, as
+    scipy-style trimming of floor(proportiontocut * n) values from each end
+    of the sorted window (NaNs sorting last), or the NaN-ignoring mean if
+    that would leave nothing.
+    """
+    N = x.shape[0]
+    trend = np.empty(N)
+    srt = np.empty(N)     # finite y of the window [lo, hi), sorted
+    n_fin = 0
+    n_nan = 0
+    lo = 0
+    hi = 0
+    for i in range(N):
+        xi = x[i]
+        half = wld[i] / 2
+
+        # window ends: searchsorted, then settled with the exact test
+        new_lo = np.searchsorted(x, xi - half)
+        while new_lo > 0 and np.abs(x[new_lo - 1] - xi) <= half:
+            new_lo -= 1
+        while new_lo < i and not np.abs(x[new_lo] - xi) <= half:
+            new_lo += 1
+        new_hi = np.searchsorted(x, xi + half, side='right')
+        while new_hi < N and np.abs(x[new_hi] - xi) <= half:
+            new_hi += 1
+        while new_hi > i + 1 and not np.abs(x[new_hi - 1] - xi) <= half:
+            new_hi -= 1
+
+        if new_lo >= hi or new_hi <= lo:
+            # disjoint from the last window: rebuild
+            n_fin = 0
+            n_nan = 0
+            for j in range(new_lo, new_hi):
+                if np.isnan(y[j]):
+                    n_nan += 1
+                else:
+                    srt[n_fin] = y[j]
+                    n_fin += 1
+            srt[:n_fin].sort()
+        else:
+            for j in range(lo, new_lo):
+                n_fin, n_nan = _window_remove(srt, n_fin, n_nan, y[j])
+            for j in range(new_lo, lo):
+                n_fin, n_nan = _window_insert(srt, n_fin, n_nan, y[j])
+            for j in range(new_hi, hi):
+                n_fin, n_nan = _window_remove(srt, n_fin, n_nan, y[j])
+            for j in range(hi, new_hi):
+                n_fin, n_nan = _window_insert(srt, n_fin, n_nan, y[j])
+        lo = new_lo
+        hi = new_hi
+
+        n = n_fin + n_nan
+        k = int(np.floor(proportiontocut * n))
+        if 2 * k >= n:
+            # too much trimming → simple mean (of the finite values)
+            a = 0
+            b = n_fin
+        elif n_nan > k:
+            # sorted last, NaNs survive the trimming
+            trend[i] = np.nan
+            continue
+        else:
+            a = k
+            b = n - k
+        if b <= a:
+            trend[i] = np.nan
+            continue
+        acc = 0.0
+        for j in range(a, b):
+            acc += srt[j]
+        trend[i] = acc / (b - a)
+    return trend
+
+
+@njit(cache=True)
+def _window_insert(srt, n_fin, n_nan, v):
+    if np.isnan(v):
+        return n_fin, n_nan + 1
+    k = np.searchsorted(srt[:n_fin], v)
+    for j in range(n_fin, k, -1):
+        srt[j] = srt[j - 1]
+    srt[k] = v
+    return n_fin + 1, n_nan
+
+
+@njit(cache=True)
+def _window_remove(srt, n_fin, n_nan, v):
+    if np.isnan(v):
+        return n_fin, n_nan - 1
+    k = np.searchsorted(srt[:n_fin], v)
+    for j in range(k, n_fin - 1):
+        srt[j] = srt[j + 1]
+    return n_fin - 1, n_nan
@@ -0,0 +1,28 @@
+import os
+import sys
+import re
+import numpy as np
+import numba
+
+# jit_pbls lives outside the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'deprecated'))
+from jit_pbls import fast_pbls_search_jit
+
+def test_single_parallel_loop(capsys):
+    # Recompile without the on-disk cache: cached dispatchers carry no
+    # parfor diagnostics.
+    kernel = numba.njit(parallel=True)(fast_pbls_search_jit.py_func)
+
+    time = np.linspace(0, 10, 200)
+    flux = np.ones_like(time)
+    kernel(time, flux, np.array([2., 3.]), np.array([0.05]), 5, 2)
+
+    kernel.parallel_diagnostics(level=1)
+    out = capsys.readouterr().out
+
+    # each parallel loop is labelled "| #<ID>" in the loop listing
+    loop_ids = set(re.findall(r"\|\s*#(\d+)", out))
+    assert len(loop_ids) == 1
+
+if __name__ == "__main__":
+    test_single_parallel_loop()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from pbls.pbls import pbls_search
+from pbls.mp_pbls import fast_pbls_search
+from pbls.synthetic import generate_transit_rotation_light_curve
+
+def test_threads_backend():
+    # Several threads run pbls_search's kernel at once; this used to abort
+    # (workqueue) or hang (TBB) when that kernel was numba-parallel.
+    np.random.seed(42)
+    t = np.arange(0, 20.0, 0.01)
+
+    transit_dict = {
+        'period': 3.1666,
+        't0': 2.5,
+        'depth': 0.01,
+        'duration_hr': 3.5
+    }
+    rotation_dict = {
+        'prot': 3.8,
+        'a1': 0.04,
+        'a2': 0.01,
+        'phi1': 0.0,
+        'phi2': np.pi / 4
+    }
+    flux = generate_transit_rotation_light_curve(t, transit_dict, rotation_dict, noise_level=1e-3)
+
+    periods = np.linspace(2.5, 4.0, 16)
+    durations_hr = np.array([2.0, 3.5, 5.0])
+
+    res_std = pbls_search(t, flux, periods, durations_hr, poly_order=2)
+    res_thr = fast_pbls_search(t, flux, periods, durations_hr, poly_order=2,
+                               nworkers=4, backend='threads')
+
+    assert np.array_equal(res_std['power'], res_thr['power'])
+    assert res_std['best_params'] == res_thr['best_params']
+
+if __name__ == "__main__":
+    test_threads_backend()